@@ -1,20 +1,51 @@
-import os
 import re
 
+from extraction import find_log_files
+from log_reader import LogReader
+
+alert_pattern = re.compile(r'alert', re.IGNORECASE)
+
+def find_alert(text, lowered, pos):
+    # str.find on the lowered text is much faster than the case-insensitive regex,
+    # lower() only keeps the positions of ASCII text
+    if lowered is not None:
+        return lowered.find('alert', pos)
+    m = alert_pattern.search(text, pos)
+    return m.start() if m else -1
+
+def alert_lines(text):
+    '''
+    Yields the stripped lines of the whole content of a file that mention an alert.
+    '''
+    lowered = text.lower() if text.isascii() else None
+    pos = find_alert(text, lowered, 0)
+    while pos >= 0:
+        start = text.rfind('\n', 0, pos) + 1
+        end = text.find('\n', pos)
+        if end < 0:
+            end = len(text)
+        yield text[start:end].strip()
+        pos = find_alert(text, lowered, end)
+
+def add_alert_lines(lines, alert_patterns):
+    # line sink for extraction.merge_log_entries, the lines of one file at once
+    alert_patterns.update(alert_lines(''.join(lines)))
+
+def save_alert_patterns(patterns, path="alert_patterns.txt"):
+    with open(path, "w", encoding="utf-8") as out:
+        for pattern in sorted(patterns):
+            out.write(pattern + "\n")
+
 def extract_alert_patterns(rawdata_dir):
     alert_patterns = set()
-    for filename in os.listdir(rawdata_dir):
-        if filename.endswith('.log'):
-            filepath = os.path.join(rawdata_dir, filename)
-            with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-                for line in f:
-                    if re.search(r'alert', line, re.IGNORECASE):
-                        alert_patterns.add(line.strip())
+    # the MFS-*.log.gz files of all subfolders, e.g. rawdata/weeklong
+    files = sorted(find_log_files(rawdata_dir))
+    reader = LogReader(files)
+    for filepath in files:
+        alert_patterns.update(alert_lines(reader.text(filepath)))
+    reader.close()
     return alert_patterns
 
 if __name__ == "__main__":
     rawdata_dir = "rawdata"
-    patterns = extract_alert_patterns(rawdata_dir)
-    with open("alert_patterns.txt", "w", encoding="utf-8") as out:
-        for pattern in sorted(patterns):
-            out.write(pattern + "\n")
\ No newline at end of file
+    save_alert_patterns(extract_alert_patterns(rawdata_dir))
@@ -0,0 +1,307 @@
+import copy
+import heapq
+from itertools import repeat
+
+import pandas as pd
+
+from request_latency import timestamp_ms
+
+PIPELINE_TABLE = 'Alert Pipeline'
+BACKLOG_TABLE = 'Alert Backlog'
+# Input tables in the order an alert goes through them, rows with the same timestamp are handled in this order
+ALERT_STAGES = ['Alerts Received', 'Alerts Processing', 'Telegrams Sent', 'Alerts Handled']
+# The Alert-Thread and the MF threads log the same alert up to this much out of order
+REORDER_MS = 1000
+BACKLOG_COLUMNS = ['bucket', 'received', 'handled', 'timeouts', 'in_flight_max', 'in_flight']
+
+
+class AlertTracker:
+    '''
+    Correlates the stages of every alert from rows that arrive in timestamp order:
+    mainLoop "Alert empfangen" (Alerts Received), processAlert (Alerts Processing), the telegrams sent while
+    it is handled (Telegrams Sent) and alertHandler() "wurde verarbeitet" (Alerts Handled).
+    Received and processing rows are joined by alert name and text, oldest first, processing, sent and handled
+    rows by operation_num. A processAlert line with the lfdnr of an alert that is not handled yet is a retry
+    of that alert. Alerts without a processAlert line (MFS_START_...) go from received to handled by
+    name and text. Only the alerts and sends of the last window_ms are kept, an alert that is not handled by
+    then is emitted as a timeout. Counts the alerts in flight (received, not handled) per minute.
+    state() saves the open alerts at the end of a run, from_state resumes them in the next incremental run.
+    Sample usage:
+    tracker = AlertTracker()
+    tracker.add_received(row)
+    tracker.add_handled(row)
+    tracker.finish()
+    '''
+    def __init__(self, window_ms=120000, emit=None):
+        self.window_ms = window_ms
+        # alert number -> alert in arrival order, and the join keys -> alert numbers
+        self.alerts = {}
+        self.received = {}
+        self.unreceived = {}
+        self.processing = {}
+        self.lfdnr = {}
+        # operation_num -> timestamps of the telegrams sent in that transaction
+        self.sends = {}
+        self.send_start = {}
+        self.unmatched_sends = 0
+        self.numbers = 0
+        self.in_flight = 0
+        # minute -> [received, handled, timeouts, max in flight, in flight at the end]
+        self.minutes = {}
+        self.rows = []
+        self.emit = emit or self.rows.append
+
+    def minute(self, timestamp):
+        counts = self.minutes.get(timestamp[:16])
+        if counts is None:
+            counts = self.minutes[timestamp[:16]] = [0, 0, 0, self.in_flight, self.in_flight]
+        return counts
+
+    def change_in_flight(self, timestamp, delta):
+        self.in_flight += delta
+        counts = self.minute(timestamp)
+        counts[3] = max(counts[3], self.in_flight)
+        counts[4] = self.in_flight
+
+    def new_alert(self, row, row_ms):
+        alert = {
+            'number': self.numbers, 'start_ms': row_ms, 'alert_name': row['alert_name'], 'text': row['text'],
+            'received': None, 'received_ms': None, 'processing': None, 'processing_ms': None,
+            'handled': None, 'handled_ms': None, 'retries': 0, 'operations': [], 'sends': [],
+        }
+        self.alerts[self.numbers] = alert
+        self.numbers += 1
+        return alert
+
+    def add_received(self, row):
+        row_ms = timestamp_ms(row['timestamp'])
+        self.expire(row_ms)
+        key = (row['alert_name'], row['text'])
+        self.minute(row['timestamp'])[0] += 1
+        # the processing or handled line of this alert may have been logged just before
+        for number in self.unreceived.get(key, []):
+            alert = self.alerts[number]
+            if alert['start_ms'] >= row_ms - REORDER_MS:
+                self.unreceived[key].remove(number)
+                if not self.unreceived[key]:
+                    del self.unreceived[key]
+                alert['received'], alert['received_ms'] = row, row_ms
+                if alert['handled'] is None:
+                    self.change_in_flight(row['timestamp'], 1)
+                else:
+                    self.complete(alert, 'handled')
+                return
+        alert = self.new_alert(row, row_ms)
+        alert['received'], alert['received_ms'] = row, row_ms
+        self.received.setdefault(key, []).append(alert['number'])
+        self.change_in_flight(row['timestamp'], 1)
+
+    def take_received(self, row, row_ms):
+        # the oldest received alert with the same name and text, a new alert if there is none
+        key = (row['alert_name'], row['text'])
+        numbers = self.received.get(key)
+        if numbers:
+            alert = self.alerts[numbers.pop(0)]
+            if not numbers:
+                del self.received[key]
+            return alert
+        alert = self.new_alert(row, row_ms)
+        self.unreceived.setdefault(key, []).append(alert['number'])
+        return alert
+
+    def add_processing(self, row):
+        row_ms = timestamp_ms(row['timestamp'])
+        self.expire(row_ms)
+        number = self.lfdnr.get((row['alert_name'], row['lfdnr']))
+        if number is not None:
+            # processed again, the queue and processing times start at the first attempt
+            alert = self.alerts[number]
+            alert['retries'] += 1
+        else:
+            alert = self.take_received(row, row_ms)
+            alert['processing'], alert['processing_ms'] = row, row_ms
+            self.lfdnr[(row['alert_name'], row['lfdnr'])] = alert['number']
+        self.processing[row['operation_num']] = alert['number']
+        alert['operations'].append(row['operation_num'])
+
+    def add_sent(self, row):
+        row_ms = timestamp_ms(row['timestamp'])
+        self.expire(row_ms)
+        operation_num = row['operation_num']
+        if operation_num not in self.sends:
+            self.sends[operation_num] = []
+            self.send_start[operation_num] = row_ms
+        self.sends[operation_num].append(row['timestamp'])
+
+    def add_handled(self, row):
+        row_ms = timestamp_ms(row['timestamp'])
+        self.expire(row_ms)
+        number = self.processing.pop(row['operation_num'], None)
+        alert = self.alerts[number] if number is not None else self.take_received(row, row_ms)
+        alert['handled'], alert['handled_ms'] = row, row_ms
+        alert['sends'] = self.sends.pop(row['operation_num'], [])
+        self.send_start.pop(row['operation_num'], None)
+        self.minute(row['timestamp'])[1] += 1
+        if alert['received'] is not None:
+            self.change_in_flight(row['timestamp'], -1)
+            self.complete(alert, 'handled')
+        # without received line it waits for the window, the line may still follow within REORDER_MS
+
+    def complete(self, alert, status):
+        del self.alerts[alert['number']]
+        key = (alert['alert_name'], alert['text'])
+        for index in (self.received, self.unreceived):
+            numbers = index.get(key)
+            if numbers and alert['number'] in numbers:
+                numbers.remove(alert['number'])
+                if not numbers:
+                    del index[key]
+        processing = alert['processing']
+        if processing is not None:
+            del self.lfdnr[(alert['alert_name'], processing['lfdnr'])]
+            for operation_num in alert['operations']:
+                if self.processing.get(operation_num) == alert['number']:
+                    del self.processing[operation_num]
+        self.emit(self.row(alert, status))
+
+    def row(self, alert, status):
+        received, processing, handled = alert['received'], alert['processing'], alert['handled']
+        first = received or processing or handled
+        handler = handled or processing or {}
+        received_ms, processing_ms, handled_ms = alert['received_ms'], alert['processing_ms'], alert['handled_ms']
+        started_ms = processing_ms if processing_ms is not None else handled_ms
+
+        def delta(end, start):
+            # the threads log up to REORDER_MS out of order, a later stage can have an earlier timestamp
+            return max(end - start, 0) if end is not None and start is not None else None
+
+        return {
+            'timestamp': first['timestamp'],
+            'alert_name': alert['alert_name'],
+            'lfdnr': processing['lfdnr'] if processing else None,
+            'thread': handler.get('thread'),
+            'operation_num': handler.get('operation_num'),
+            'processing_timestamp': processing['timestamp'] if processing else None,
+            'handled_timestamp': handled['timestamp'] if handled else None,
+            # waiting in the queue until the MF thread starts on it
+            'queue_ms': delta(started_ms, received_ms),
+            'processing_ms': delta(handled_ms, processing_ms),
+            'handler_ms': int(handled['time_ms']) if handled and handled['time_ms'] is not None else None,
+            'total_ms': delta(handled_ms, received_ms),
+            'retries': alert['retries'],
+            'telegrams': len(alert['sends']),
+            'last_send_timestamp': alert['sends'][-1] if alert['sends'] else None,
+            'status': status if received is not None or status == 'timeout' else 'not_received',
+        }
+
+    def timeout(self, alert):
+        if alert['handled'] is None:
+            if alert['received'] is not None:
+                timestamp = alert['received']['timestamp']
+                self.minute(timestamp)[2] += 1
+                self.change_in_flight(timestamp, -1)
+            self.complete(alert, 'timeout')
+        else:
+            # handled, the received line was before the processed logs
+            self.complete(alert, 'handled')
+
+    def expire(self, now):
+        while self.alerts:
+            alert = next(iter(self.alerts.values()))
+            if now - alert['start_ms'] <= self.window_ms:
+                break
+            self.timeout(alert)
+        while self.send_start:
+            operation_num, start_ms = next(iter(self.send_start.items()))
+            if now - start_ms <= self.window_ms:
+                break
+            # telegrams of a transaction that did not handle an alert
+            del self.send_start[operation_num]
+            self.unmatched_sends += len(self.sends.pop(operation_num))
+
+    def state(self):
+        '''
+        The open alerts, the telegrams of the open transactions and the minute counts that they can still change,
+        as JSON for result/manifest.json.
+        '''
+        alerts = list(self.alerts.values())
+        # finish and the next rows change the minutes from the first open received alert or the last minute on
+        minutes = [alert['received']['timestamp'][:16] for alert in alerts if alert['received'] is not None]
+        first = min(minutes + [max(self.minutes)]) if self.minutes else None
+        # a copy, finish changes the lists and counts after the state is taken
+        return copy.deepcopy({
+            'numbers': self.numbers,
+            'in_flight': self.in_flight,
+            # lists, the order of the alerts and sends is the order of their timeouts
+            'alerts': alerts,
+            'received': [[*key, numbers] for key, numbers in self.received.items()],
+            'unreceived': [[*key, numbers] for key, numbers in self.unreceived.items()],
+            'processing': self.processing,
+            'lfdnr': [[*key, number] for key, number in self.lfdnr.items()],
+            'sends': [[operation_num, start_ms, self.sends[operation_num]]
+                      for operation_num, start_ms in self.send_start.items()],
+            'minutes': {minute: counts for minute, counts in self.minutes.items() if minute >= first},
+        })
+
+    @classmethod
+    def from_state(cls, state, window_ms=120000, emit=None):
+        tracker = cls(window_ms, emit)
+        tracker.numbers = state['numbers']
+        tracker.in_flight = state['in_flight']
+        tracker.alerts = {alert['number']: alert for alert in state['alerts']}
+        tracker.received = {(name, text): numbers for name, text, numbers in state['received']}
+        tracker.unreceived = {(name, text): numbers for name, text, numbers in state['unreceived']}
+        tracker.processing = dict(state['processing'])
+        tracker.lfdnr = {(name, lfdnr): number for name, lfdnr, number in state['lfdnr']}
+        for operation_num, start_ms, sends in state['sends']:
+            tracker.send_start[operation_num] = start_ms
+            tracker.sends[operation_num] = sends
+        tracker.minutes = dict(state['minutes'])
+        return tracker
+
+    def finish(self):
+        # the rest of the last alerts is not in the processed logs
+        while self.alerts:
+            self.timeout(next(iter(self.alerts.values())))
+        for operation_num in list(self.sends):
+            self.unmatched_sends += len(self.sends.pop(operation_num))
+        self.send_start.clear()
+
+    def backlog(self):
+        '''
+        One row per minute with the alerts received, handled and timed out and the alerts in flight
+        (received, not handled yet): the maximum within the minute and the count at its end.
+        '''
+        df = pd.DataFrame([[minute] + counts for minute, counts in self.minutes.items()], columns=BACKLOG_COLUMNS)
+        df['bucket'] = pd.to_datetime(df['bucket'], format='%Y.%m.%d %H:%M')
+        return df.sort_values('bucket', kind='stable', ignore_index=True)
+
+
+def track_alerts(results, window_ms=120000, state=None):
+    '''
+    Runs the AlertTracker over the four alert tables of parse_log_lines in one pass, with state it resumes the
+    alerts that were open at the end of the earlier run.
+    Returns the alert rows ordered by their first timestamp and the tracker with the minute counts, its open_state
+    (the state before finish) and finished (the positions of the rows that finish emitted).
+    Sample usage:
+    rows, tracker = track_alerts(results)
+    tracker.backlog()
+    '''
+    tracker = AlertTracker.from_state(state, window_ms) if state else AlertTracker(window_ms)
+    add = {
+        'Alerts Received': tracker.add_received,
+        'Alerts Processing': tracker.add_processing,
+        'Telegrams Sent': tracker.add_sent,
+        'Alerts Handled': tracker.add_handled,
+    }
+    # heapq.merge keeps the order of ALERT_STAGES for rows with the same timestamp
+    streams = [zip(repeat(name), results[name]) for name in ALERT_STAGES]
+    for name, row in heapq.merge(*streams, key=lambda event: event[1]['timestamp']):
+        add[name](row)
+    tracker.open_state = tracker.state()
+    closed = len(tracker.rows)
+    tracker.finish()
+    order = sorted(range(len(tracker.rows)), key=lambda k: tracker.rows[k]['timestamp'])
+    tracker.rows = [tracker.rows[k] for k in order]
+    tracker.finished = [position for position, k in enumerate(order) if k >= closed]
+    return tracker.rows, tracker
@@ -0,0 +1,210 @@
+import os
+import re
+import gzip
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from extraction import find_log_files, file_signature, log_entries
+from combined_logs import combined_entry
+from log_reader import inflate, split_lines
+
+ARCHIVE_DIR = 'result/archive'
+# Uncompressed bytes per gzip member, one lookup inflates about this much per block it touches
+BLOCK_SIZE = 1 << 20
+LOG_TIMESTAMP_FORMAT = '%Y.%m.%d %H:%M:%S.%f'
+
+# Start of a log entry with its timestamp and operation_num, on the raw bytes
+entry_start_pattern = re.compile(rb'^\[(\d{4}\.\d{2}\.\d{2} \d{2}:\d{2}:\d{2}\.\d{3}) \w [^\s\]]+ (\w+) ', re.MULTILINE)
+group_pattern = re.compile(rb'G(\d+)')
+
+
+def to_ms(timestamp):
+    # log timestamps ('2025.02.07 10:00:00.066') or anything else pd.Timestamp accepts, without time zone
+    return pd.Timestamp(timestamp).value // 1000000
+
+
+def to_log_timestamp(timestamp):
+    return pd.Timestamp(timestamp).strftime(LOG_TIMESTAMP_FORMAT)[:23]
+
+
+def archive_paths(file_path, directory=ARCHIVE_DIR):
+    name = os.path.basename(file_path)
+    return os.path.join(directory, name), os.path.join(directory, name.removesuffix('.gz') + '.idx.npz')
+
+
+def index_log_file(file_path, directory=ARCHIVE_DIR, block_size=BLOCK_SIZE):
+    '''
+    Writes a copy of one log file as a series of gzip members of about block_size uncompressed bytes, cut at the start
+    of an entry, and its index: offset, length and first/last timestamp of every member and the operation_num
+    -> member pairs. Python's zlib cannot resume inflating in the middle of a deflate stream (zran needs
+    inflatePrime), independent members can be inflated on their own. The copy is still one valid .log.gz file.
+    '''
+    os.makedirs(directory, exist_ok=True)
+    data = inflate(file_path)
+    archive_path, index_path = archive_paths(file_path, directory)
+
+    # entry starts with their timestamp and operation_num, the blocks are cut at the first entry after block_size
+    cuts = [0]
+    block_first, block_last = [], []
+    group_keys, group_blocks = [], []
+    first = last = None
+    groups = set()
+    for m in entry_start_pattern.finditer(data):
+        if m.start() - cuts[-1] >= block_size:
+            cuts.append(m.start())
+            block_first.append(first)
+            block_last.append(last)
+            group_keys.extend(groups)
+            group_blocks.extend([len(block_first) - 1] * len(groups))
+            first = last = None
+            groups = set()
+        timestamp = m.group(1)
+        # the hourly files are nearly sorted, first and last are the min and max of the block
+        if first is None or timestamp < first:
+            first = timestamp
+        if last is None or timestamp > last:
+            last = timestamp
+        group = group_pattern.fullmatch(m.group(2))
+        if group:
+            groups.add(int(group.group(1)))
+    block_first.append(first)
+    block_last.append(last)
+    group_keys.extend(groups)
+    group_blocks.extend([len(block_first) - 1] * len(groups))
+    cuts.append(len(data))
+
+    offsets, lengths = [], []
+    tmp_path = archive_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        for start, end in zip(cuts[:-1], cuts[1:]):
+            member = gzip.compress(data[start:end], compresslevel=6, mtime=0)
+            offsets.append(f.tell())
+            lengths.append(len(member))
+            f.write(member)
+    os.replace(tmp_path, archive_path)
+
+    group_keys = np.array(group_keys, dtype=np.int64)
+    group_blocks = np.array(group_blocks, dtype=np.int32)
+    order = np.lexsort((group_blocks, group_keys))
+    signature = file_signature(file_path)
+    np.savez_compressed(
+        index_path,
+        offsets=np.array(offsets, dtype=np.int64),
+        lengths=np.array(lengths, dtype=np.int64),
+        first_ms=np.array([to_ms(t.decode()) if t else -1 for t in block_first], dtype=np.int64),
+        last_ms=np.array([to_ms(t.decode()) if t else -1 for t in block_last], dtype=np.int64),
+        group_keys=group_keys[order],
+        group_blocks=group_blocks[order],
+        source_size=signature['size'],
+        source_mtime=signature['mtime'],
+    )
+    return len(offsets)
+
+
+def build_archive_index(folder='rawdata', directory=ARCHIVE_DIR, block_size=BLOCK_SIZE):
+    '''
+    Indexes the log files of folder that are new or changed since their index was written.
+    '''
+    os.makedirs(directory, exist_ok=True)
+    indexed = 0
+    for file_path in sorted(find_log_files(folder)):
+        _, index_path = archive_paths(file_path, directory)
+        if os.path.exists(index_path):
+            with np.load(index_path) as index:
+                signature = {'size': int(index['source_size']), 'mtime': int(index['source_mtime'])}
+            if signature == file_signature(file_path):
+                continue
+        blocks = index_log_file(file_path, directory, block_size)
+        indexed += 1
+        print(f"{os.path.basename(file_path)}: {blocks} blocks")
+    return indexed
+
+
+class ArchiveIndex:
+    '''
+    The block indexes of all archived log files, loaded once. read_range and read_group only inflate the blocks
+    that can hold matching entries and return them as DataFrames with the columns 0-5 of dataset.log_output().
+    Sample usage:
+    archive = ArchiveIndex()
+    archive.read_range('2025-02-07 10:00:00', '2025-02-07 10:00:05')
+    archive.read_group('G41852041')
+    '''
+    def __init__(self, directory=ARCHIVE_DIR):
+        self.directory = directory
+        self.files = sorted(f.removesuffix('.idx.npz') for f in os.listdir(directory) if f.endswith('.idx.npz'))
+        parts = {key: [] for key in ['file', 'offsets', 'lengths', 'first_ms', 'last_ms']}
+        group_keys, group_blocks = [], []
+        blocks = 0
+        for code, name in enumerate(self.files):
+            with np.load(os.path.join(directory, name + '.idx.npz')) as index:
+                for key in ['offsets', 'lengths', 'first_ms', 'last_ms']:
+                    parts[key].append(index[key])
+                parts['file'].append(np.full(len(index['offsets']), code, dtype=np.int32))
+                group_keys.append(index['group_keys'])
+                # block numbers over all files
+                group_blocks.append(index['group_blocks'].astype(np.int64) + blocks)
+                blocks += len(index['offsets'])
+        for key, values in parts.items():
+            setattr(self, key, np.concatenate(values) if values else np.array([], dtype=np.int64))
+        group_keys = np.concatenate(group_keys) if group_keys else np.array([], dtype=np.int64)
+        group_blocks = np.concatenate(group_blocks) if group_blocks else np.array([], dtype=np.int64)
+        order = np.argsort(group_keys, kind='stable')
+        self.group_keys, self.group_blocks = group_keys[order], group_blocks[order]
+
+    def read_entries(self, blocks):
+        # blocks of the same file are read with one open, every block starts with an entry,
+        # the entries are split with the header regex of extraction.py and get the combined log message
+        entries = []
+        for code in np.unique(self.file[blocks]):
+            with open(os.path.join(self.directory, self.files[code] + '.gz'), 'rb') as f:
+                for block in blocks[self.file[blocks] == code]:
+                    f.seek(self.offsets[block])
+                    lines = split_lines(gzip.decompress(f.read(self.lengths[block])))
+                    entries.extend(combined_entry(entry) for entry in log_entries(lines))
+        return entries
+
+    @staticmethod
+    def to_frame(entries):
+        df = pd.DataFrame(entries, columns=range(6))
+        df[0] = pd.to_datetime(df[0], format=LOG_TIMESTAMP_FORMAT)
+        return df.sort_values(0, kind='stable', ignore_index=True)
+
+    def read_range(self, start, end):
+        '''
+        The entries with start <= timestamp < end.
+        '''
+        start_ms, end_ms = to_ms(start), to_ms(end)
+        blocks = np.flatnonzero((self.first_ms < end_ms) & (self.last_ms >= start_ms))
+        start_text, end_text = to_log_timestamp(start), to_log_timestamp(end)
+        return self.to_frame([entry for entry in self.read_entries(blocks) if start_text <= entry[0] < end_text])
+
+    def read_group(self, operation_num):
+        '''
+        The entries of one operation_num, e.g. 'G41852041'.
+        '''
+        key = int(str(operation_num).lstrip('G'))
+        first = np.searchsorted(self.group_keys, key, side='left')
+        last = np.searchsorted(self.group_keys, key, side='right')
+        blocks = np.unique(self.group_blocks[first:last])
+        operation_num = 'G' + str(key)
+        return self.to_frame([entry for entry in self.read_entries(blocks) if entry[3] == operation_num])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Seekable copies of the log files with a block index and lookups')
+    parser.add_argument('--folder', default='rawdata', help='folder with the MFS-*.log.gz files')
+    parser.add_argument('--block-size', type=int, default=BLOCK_SIZE // 1024, help='uncompressed KB per block')
+    parser.add_argument('--range', nargs=2, metavar=('START', 'END'), help='print the entries of a time range')
+    parser.add_argument('--group', help='print the entries of one operation_num')
+    args = parser.parse_args()
+
+    if args.range or args.group:
+        archive = ArchiveIndex()
+        df = archive.read_range(*args.range) if args.range else archive.read_group(args.group)
+        for row in df.itertuples(index=False):
+            print(row[0], row[1], row[2], row[3], row[4], row[5])
+    else:
+        indexed = build_archive_index(args.folder, block_size=args.block_size * 1024)
+        print(f"{indexed} log files indexed in {ARCHIVE_DIR}")
@@ -0,0 +1,220 @@
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import argparse
+import platform
+import resource
+import subprocess
+from datetime import datetime
+
+import extraction
+from extraction import (
+    OUTPUT_TABLES, timestamp_pattern, collect_and_sort_log_lines, parse_log_lines, write_request,
+    parse_execute_rbg, parse_handle_request, parse_vb, parse_path_movement, parse_alert, parse_telegram,
+    check_sequence, check_position, getset_nio,
+)
+from generate_logs import LogGenerator
+from path_routes import encode_routes
+
+RESULTS_FILE = 'result/benchmarks.jsonl'
+
+# Logger function -> parser, as called by the handlers in extraction.py
+PARSERS = {
+    'executeRbg': parse_execute_rbg,
+    'handleRequest': parse_handle_request,
+    'isVBOK': parse_vb,
+    'getPathForMovement': parse_path_movement,
+    'checkSequence': check_sequence,
+    'isPositionOK': check_position,
+    'mainLoop': parse_alert,
+    'processAlert': parse_alert,
+    'alertHandler()': parse_alert,
+    'fmRbgTelDisp': parse_telegram,
+    'send': parse_telegram,
+    'getAndSetNioDestination': getset_nio,
+}
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def timed(stages, name, func):
+    '''
+    Runs func once and records its seconds and the peak RSS so far under stages[name].
+    '''
+    start = time.perf_counter()
+    result = func()
+    stages[name] = {'seconds': time.perf_counter() - start, 'peak_rss_mb': round(peak_rss_mb(), 1)}
+    return result
+
+
+def benchmark_parsers(lines):
+    '''
+    Calls every parse_* function on the content of the lines it handles and returns calls, seconds and calls/s per parser.
+    '''
+    contents = {}
+    for line in lines:
+        m = timestamp_pattern.match(line)
+        if m:
+            function_name = m.group(5).rsplit('.', 1)[-1]
+            if function_name in PARSERS:
+                contents.setdefault(function_name, []).append(m.group(6))
+
+    parsers = {}
+    for function_name, parser_contents in contents.items():
+        parser = PARSERS[function_name]
+        start = time.perf_counter()
+        for content in parser_contents:
+            parser(content)
+        seconds = time.perf_counter() - start
+        parsers[function_name] = {
+            'parser': parser.__name__,
+            'calls': len(parser_contents),
+            'seconds': round(seconds, 3),
+            'calls_per_s': round(len(parser_contents) / max(seconds, 1e-9)),
+        }
+    return parsers
+
+
+def benchmark_writes(results, output_formats, workdir):
+    '''
+    Writes every output table with write_request in each format, returns seconds and bytes per format.
+    '''
+    writes = {}
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        os.makedirs('result', exist_ok=True)
+        for output_format in output_formats:
+            start = time.perf_counter()
+            for name in OUTPUT_TABLES:
+                write_request(results[name], name, output_format)
+            seconds = time.perf_counter() - start
+            size = sum(os.path.getsize(os.path.join('result', f)) for f in os.listdir('result')
+                       if f.endswith(extraction.OUTPUT_EXTENSIONS[output_format]))
+            writes[output_format] = {'seconds': round(seconds, 3), 'mb': round(size / 2**20, 2),
+                                     'peak_rss_mb': round(peak_rss_mb(), 1)}
+    finally:
+        os.chdir(cwd)
+    return writes
+
+
+def run_benchmark(folder, output_formats):
+    '''
+    Benchmarks reading, parsing and writing the MFS-*.log.gz files in folder and returns the record.
+    '''
+    files = extraction.find_log_files(folder)
+    stages = {}
+
+    lines = timed(stages, 'collect_and_sort_log_lines', lambda: collect_and_sort_log_lines(folder))
+    results, _ = timed(stages, 'parse_log_lines', lambda: parse_log_lines(lines))
+
+    mb = sum(len(line) for line in lines) / 2**20
+    for stage in stages.values():
+        stage['lines_per_s'] = round(len(lines) / stage['seconds'])
+        stage['mb_per_s'] = round(mb / stage['seconds'], 2)
+        stage['seconds'] = round(stage['seconds'], 3)
+
+    # The extraction writes route ids instead of the hops
+    encode_routes(results['Path Movement Finished'])
+    workdir = tempfile.mkdtemp(prefix='mfs-benchmark-')
+    try:
+        writes = benchmark_writes(results, output_formats, workdir)
+    finally:
+        shutil.rmtree(workdir)
+
+    return {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'folder': folder,
+        'files': len(files),
+        'lines': len(lines),
+        'mb': round(mb, 2),
+        'compressed_mb': round(sum(os.path.getsize(f) for f in files) / 2**20, 2),
+        'rows': {name: len(results[name]) for name in OUTPUT_TABLES},
+        'stages': stages,
+        'parsers': benchmark_parsers(lines),
+        'write_request': writes,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+
+def load_results(path=RESULTS_FILE):
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def print_record(record, previous=None):
+    '''
+    Prints the record, with the change against the previous run on the same input if there is one.
+    '''
+    def change(value, old):
+        if not old:
+            return ''
+        return f" ({(value / old - 1) * 100:+.1f}%)"
+
+    print(f"{record['files']} files, {record['lines']} lines, {record['mb']} MB ({record['compressed_mb']} MB gzip)")
+    for name, stage in record['stages'].items():
+        old = previous['stages'].get(name, {}).get('lines_per_s') if previous else None
+        print(f"  {name:28} {stage['seconds']:8.2f}s {stage['lines_per_s']:>9} lines/s{change(stage['lines_per_s'], old)}"
+              f" {stage['mb_per_s']:8.2f} MB/s  peak {stage['peak_rss_mb']} MB")
+    for function_name, parser in record['parsers'].items():
+        old = previous['parsers'].get(function_name, {}).get('calls_per_s') if previous else None
+        print(f"  {parser['parser']:28} {parser['seconds']:8.2f}s {parser['calls_per_s']:>9} calls/s{change(parser['calls_per_s'], old)}"
+              f"  {parser['calls']} x {function_name}")
+    for output_format, write in record['write_request'].items():
+        old = previous['write_request'].get(output_format, {}).get('seconds') if previous else None
+        print(f"  write_request {output_format:14} {write['seconds']:8.2f}s{change(write['seconds'], old)}  {write['mb']} MB")
+    print(f"  peak RSS {record['peak_rss_mb']} MB")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the extraction on real or synthetic MFS logs')
+    parser.add_argument('--folder', default=None, help='folder with MFS-*.log.gz files, default: generate synthetic logs')
+    parser.add_argument('--hours', type=int, default=1, help='hours of synthetic logs to generate (744 for a month)')
+    parser.add_argument('--lines-per-hour', type=int, default=150000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--formats', nargs='+', default=['pickle', 'parquet'], choices=list(extraction.OUTPUT_EXTENSIONS))
+    parser.add_argument('--output', default=RESULTS_FILE, help='JSON lines file the runs are appended to')
+    args = parser.parse_args()
+
+    generated = None
+    folder = args.folder
+    if folder is None:
+        generated = folder = tempfile.mkdtemp(prefix='mfs-synthetic-')
+        print(f"Generating {args.hours} hours of synthetic logs")
+        LogGenerator(args.seed, args.lines_per_hour).write_hours(folder, datetime(2025, 2, 6), args.hours)
+
+    try:
+        record = run_benchmark(folder, args.formats)
+    finally:
+        if generated:
+            shutil.rmtree(generated)
+    if generated:
+        record['folder'] = f"synthetic hours={args.hours} lines_per_hour={args.lines_per_hour} seed={args.seed}"
+
+    # Compare with the last run on the same input
+    previous = [old for old in load_results(args.output) if old['folder'] == record['folder']]
+    print_record(record, previous[-1] if previous else None)
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record) + '\n')
+    print(f"Saved to {args.output}", file=sys.stderr)
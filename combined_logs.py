@@ -1,86 +1,177 @@
 import os
-import re
-import gzip
 import csv
-import pickle
+import shutil
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 
-# Set to your relative or absolute folder path
-folder = "rawdata/weeklong"
-max_files = None  # Optional: limit for debugging
-
-# Regex pattern
-timestamp_pattern = re.compile(
-    r'^\[(\d{4}\.\d{2}\.\d{2} \d{2}:\d{2}:\d{2}\.\d{3}) (\w) ([^\s\]]+) (\w+) ([^\]]+)\]\s*(.*)$'
-)
-
-# Collect files
-files = []
-for root, _, fs in os.walk(folder):
-    for file in fs:
-        if file.endswith(".log.gz"):
-            files.append(os.path.join(root, file))
-
-if max_files:
-    files = sorted(files)[:max_files]
-
-print(f"🗂 Found {len(files)} files.")
-
-# Parsing setup
-entries = []
-current_entry = ""
-current_match = None
-match_count = 0
-line_count = 0
-
-def flush_entry():
-    if current_match and current_entry:
-        timestamp, level, lane, group_id, code = current_match.groups()[:5]
-        description = current_entry.strip()
-        entries.append([timestamp, level, lane, group_id, code, description])
-
-# Process files
-for file_path in files:
-    print(f"📖 Processing: {file_path}")
-    open_func = gzip.open if file_path.endswith(".gz") else open
-    with open_func(file_path, 'rt', encoding='utf-8', errors='ignore') as f:
-        for line in f:
-            line_count += 1
-            match = timestamp_pattern.match(line)
-            if match:
-                flush_entry()
-                current_match = match
-                current_entry = match.group(6) + "\n"
-                match_count += 1
-            else:
-                current_entry += line
-
-# Final flush
-flush_entry()
-
-print(f"✅ Total lines read: {line_count}")
-print(f"✅ Log entries matched: {match_count}")
-print(f"✅ Log entries parsed: {len(entries)}")
-
-# Save CSV
-if entries:
-    csv_path = "parsed_log_output.csv"
-    with open(csv_path, "w", encoding="utf-8", newline='') as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(["Timestamp", "Level", "Lane", "GroupID", "Code", "Message"])
-        writer.writerows(entries)
-    print(f"💾 Saved {csv_path}")
-
-    # Save pickle version
-    pkl_path = "parsed_log_output.pkl.gz"
-    with gzip.open(pkl_path, "wb") as pkl_file:
-        pickle.dump(entries, pkl_file)
-    print(f"💾 Saved {pkl_path}")
-
-    # ✅ Display first 20 rows as DataFrame
-    df = pd.DataFrame(entries, columns=["Timestamp", "Level", "Lane", "GroupID", "Code", "Message"])
-    print("\n🧾 First 20 log entries:")
-    print(df.head(20))
-
-else:
-    print("⚠️ No log entries were parsed. Check your regex or log format.")
+from extraction import TIMESTAMP_FORMAT, find_log_files, merge_log_entries
+
+COMBINED_COLUMNS = ["Timestamp", "Level", "Lane", "GroupID", "Code", "Message"]
+# One folder per hour (e.g. result/combined_log/2025-02-07_10) with parquet part files
+COMBINED_DIR = 'result/combined_log'
+# Rows per write, the writer holds at most one chunk
+COMBINED_CHUNK_ROWS = 50000
+# Level, lane, group id and code have few distinct values, they are dictionary encoded
+COMBINED_SCHEMA = pa.schema([
+    ('timestamp', pa.timestamp('ms')),
+    ('level', pa.dictionary(pa.int32(), pa.string())),
+    ('lane', pa.dictionary(pa.int32(), pa.string())),
+    ('group_id', pa.dictionary(pa.int32(), pa.string())),
+    ('code', pa.dictionary(pa.int32(), pa.string())),
+    ('message', pa.string()),
+])
+
+
+def combined_entry(entry):
+    # one row per log entry, the message keeps the continuation lines (stack traces) of the entry
+    timestamp, level, lane, group_id, code, content = entry
+    return [timestamp, level, lane, group_id, code, content.strip()]
+
+
+def hour_folder(hour, directory=COMBINED_DIR):
+    # '2025.02.07 10' -> result/combined_log/2025-02-07_10
+    return os.path.join(directory, hour[:10].replace('.', '-') + '_' + hour[11:13])
+
+
+class CombinedLogWriter:
+    '''
+    Writes the combined log entries, which arrive in timestamp order, to one folder per hour in chunks of chunk_rows.
+    A folder gets one parquet file per run, so incremental runs that add entries to an hour add a file.
+    With csv_path every entry is also appended to that CSV.
+    Sample usage:
+    writer = CombinedLogWriter()
+    for entry in merge_log_entries(files):
+        writer.add(entry)
+    writer.close()
+    '''
+    def __init__(self, directory=COMBINED_DIR, append=False, chunk_rows=COMBINED_CHUNK_ROWS, csv_path=None):
+        if not append and os.path.isdir(directory):
+            shutil.rmtree(directory)
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.chunk_rows = chunk_rows
+        self.hour = None
+        self.writer = None
+        self.rows = []
+        self.entries = 0
+        self.csv_file = open(csv_path, 'w', encoding='utf-8', newline='') if csv_path else None
+        if self.csv_file:
+            self.csv_writer = csv.writer(self.csv_file)
+            self.csv_writer.writerow(COMBINED_COLUMNS)
+
+    def add(self, entry):
+        row = combined_entry(entry)
+        hour = row[0][:13]
+        if hour != self.hour:
+            self.close_hour()
+            self.hour = hour
+        self.rows.append(row)
+        self.entries += 1
+        if len(self.rows) >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        columns = list(zip(*self.rows))
+        timestamps = pd.to_datetime(pd.Series(columns[0]), format=TIMESTAMP_FORMAT)
+        arrays = [pa.array(timestamps, pa.timestamp('ms'))]
+        arrays += [pa.array(values, pa.string()).dictionary_encode() for values in columns[1:5]]
+        arrays.append(pa.array(columns[5], pa.string()))
+        table = pa.Table.from_arrays(arrays, schema=COMBINED_SCHEMA)
+
+        if self.writer is None:
+            folder = hour_folder(self.hour, self.directory)
+            os.makedirs(folder, exist_ok=True)
+            part = len([f for f in os.listdir(folder) if f.endswith('.parquet')])
+            self.writer = pq.ParquetWriter(os.path.join(folder, f"part-{part}.parquet"), COMBINED_SCHEMA)
+        self.writer.write_table(table)
+        if self.csv_file:
+            self.csv_writer.writerows(self.rows)
+        self.rows = []
+
+    def close_hour(self):
+        self.flush()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def close(self):
+        self.close_hour()
+        if self.csv_file:
+            self.csv_file.close()
+
+
+def read_combined(start=None, end=None, columns=None, directory=COMBINED_DIR):
+    '''
+    Reads the combined log entries with start <= timestamp < end, only the hour folders of that range are read.
+    Sample usage:
+    read_combined('2025-02-07 10:00', '2025-02-07 11:00')
+    '''
+    start = pd.Timestamp(start) if start is not None else None
+    end = pd.Timestamp(end) if end is not None else None
+    # the timestamp is needed for the range and the order even if it is not requested
+    read_columns = columns if columns is None or 'timestamp' in columns else ['timestamp'] + list(columns)
+    tables = []
+    appended = False
+    for name in sorted(os.listdir(directory)) if os.path.isdir(directory) else []:
+        hour = pd.Timestamp(name.replace('_', ' ') + ':00')
+        if (start is not None and hour + pd.Timedelta(hours=1) <= start) or (end is not None and hour >= end):
+            continue
+        folder = os.path.join(directory, name)
+        parts = sorted(f for f in os.listdir(folder) if f.endswith('.parquet'))
+        appended |= len(parts) > 1
+        for part in parts:
+            tables.append(pq.read_table(os.path.join(folder, part), columns=read_columns))
+
+    if tables:
+        # the dictionaries differ per chunk, unify_dictionaries makes one categorical per column
+        df = pa.concat_tables(tables).unify_dictionaries().to_pandas()
+    else:
+        df = COMBINED_SCHEMA.empty_table().select(read_columns or COMBINED_SCHEMA.names).to_pandas()
+    if start is not None or end is not None:
+        mask = pd.Series(True, index=df.index)
+        if start is not None:
+            mask &= df['timestamp'] >= start
+        if end is not None:
+            mask &= df['timestamp'] < end
+        df = df[mask]
+    if appended:
+        # an hour got a part file from a later incremental run
+        df = df.sort_values('timestamp', kind='stable')
+    df = df.reset_index(drop=True)
+    return df[list(columns)] if columns is not None else df
+
+
+if __name__ == "__main__":
+    # Set to your relative or absolute folder path
+    folder = "rawdata/weeklong"
+    max_files = None  # Optional: limit for debugging
+    csv_path = None  # Optional: also write all entries to this CSV, e.g. "parsed_log_output.csv"
+
+    files = find_log_files(folder, max_files)
+    print(f"🗂 Found {len(files)} files.")
+
+    # The files are read with the same reader and header regex as extraction.py, entries come in timestamp order.
+    # python extraction.py --combined writes the same store while it parses.
+    line_counts = []
+    count_lines = lambda lines: line_counts.append(len(lines))
+    writer = CombinedLogWriter(csv_path=csv_path)
+    head = []
+    for entry in merge_log_entries(files, [count_lines]):
+        writer.add(entry)
+        if len(head) < 20:
+            head.append(combined_entry(entry))
+    writer.close()
+
+    print(f"✅ Total lines read: {sum(line_counts)}")
+    print(f"✅ Log entries parsed: {writer.entries}")
+
+    if writer.entries:
+        print(f"💾 Saved {COMBINED_DIR}" + (f" and {csv_path}" if csv_path else ""))
+        print("\n🧾 First 20 log entries:")
+        print(pd.DataFrame(head, columns=COMBINED_COLUMNS))
+
+    else:
+        print("⚠️ No log entries were parsed. Check your regex or log format.")
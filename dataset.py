@@ -0,0 +1,195 @@
+import os
+import gzip
+import json
+import pickle
+from collections import OrderedDict
+
+import pandas as pd
+
+from alert_pipeline import BACKLOG_TABLE, PIPELINE_TABLE
+from combined_logs import COMBINED_DIR, read_combined
+from extraction import MANIFEST_FILE, OUTPUT_EXTENSIONS, OUTPUT_TABLES, TIMESTAMP_FORMAT, request_filename
+from request_latency import LATENCY_TABLE, PERCENTILE_TABLE
+from rollups import ROLLUP_GRAINS
+from templates import TEMPLATE_TABLE
+
+# Combined log pickle of earlier versions of combined_logs.py, read if there is no result/combined_log
+LOG_OUTPUT_FILE = 'result/parsed_log_output.pkl.gz'
+
+DATASET_TABLES = (OUTPUT_TABLES + [TEMPLATE_TABLE, LATENCY_TABLE, PERCENTILE_TABLE] + list(ROLLUP_GRAINS.values())
+                  + [PIPELINE_TABLE, BACKLOG_TABLE])
+# Attribute name -> output table, e.g. dataset.execute_rbg
+TABLE_ATTRIBUTES = {name.lower().replace(' ', '_'): name for name in DATASET_TABLES}
+# Log timestamp strings of the pickled tables that are parsed on load, columns that are datetimes already are kept
+TIMESTAMP_COLUMNS = [
+    'timestamp', 'first_seen', 'last_seen', 'end_timestamp',
+    'processing_timestamp', 'handled_timestamp', 'last_send_timestamp',
+]
+# Output table -> column of the start/end range if it is not timestamp, bucket is a datetime in every format
+TIME_COLUMNS = {name: 'bucket' for name in list(ROLLUP_GRAINS.values()) + [BACKLOG_TABLE]}
+
+
+def to_timestamp(value):
+    if value is None or isinstance(value, pd.Timestamp):
+        return value
+    return pd.Timestamp(value)
+
+
+class ResultDataset:
+    '''
+    Lazy access to the output tables in result/. A table is only read on its first access,
+    parquet and feather files only read the requested columns and parquet only the row groups of the
+    requested time range. Pickles can only be read whole, they are decoded once with the timestamps parsed
+    and the columns and time range are cut from that copy.
+    At most max_tables decoded tables are kept, the least recently used one is dropped first.
+    output_format 'shared' attaches to the tables published by extraction.py --shared in shared_dir instead.
+    Sample usage:
+    ds = ResultDataset()
+    dt_execute_rbg = ds.execute_rbg
+    ResultDataset('shared').execute_rbg
+    ds.table('Execute RBG', columns=['timestamp', 'le'], start='2025-02-07 10:00', end='2025-02-07 11:00')
+    '''
+    def __init__(self, output_format=None, max_tables=4, shared_dir=None):
+        self.output_format = output_format or self.detect_format()
+        self.shared_dir = shared_dir
+        self.max_tables = max_tables
+        self.cache = OrderedDict()
+        self.routes = None
+
+    @staticmethod
+    def detect_format():
+        # the format of the last extraction, else the first one with files in result/
+        if os.path.exists(MANIFEST_FILE):
+            with open(MANIFEST_FILE, 'r', encoding='utf-8') as f:
+                return json.load(f)['format']
+        for output_format in OUTPUT_EXTENSIONS:
+            if os.path.exists(request_filename('Execute RBG', output_format)):
+                return output_format
+        return 'pickle'
+
+    def tables(self):
+        if self.output_format == 'shared':
+            from shared_tables import SHARED_DIR, load_catalog
+            return list(load_catalog(self.shared_dir or SHARED_DIR)['tables'])
+        return [name for name in DATASET_TABLES if os.path.exists(request_filename(name, self.output_format))]
+
+    def __getattr__(self, attribute):
+        if attribute in TABLE_ATTRIBUTES:
+            return self.table(TABLE_ATTRIBUTES[attribute])
+        raise AttributeError(attribute)
+
+    def __getitem__(self, name):
+        return self.table(name)
+
+    def cached(self, key, load):
+        df = self.cache.get(key)
+        if df is None:
+            df = self.cache[key] = load()
+            while len(self.cache) > self.max_tables:
+                self.cache.popitem(last=False)
+        else:
+            self.cache.move_to_end(key)
+        return df
+
+    def table(self, name, columns=None, start=None, end=None):
+        '''
+        Returns the columns of one output table (all if None) with start <= timestamp < end,
+        for the rollups start <= bucket < end.
+        '''
+        start, end = to_timestamp(start), to_timestamp(end)
+        if self.output_format == 'pickle':
+            df = self.cached((name,), lambda: self.read_pickle(name))
+            return self.select(df, columns, start, end, TIME_COLUMNS.get(name, 'timestamp'))
+        key = (name, tuple(columns) if columns else None, start, end)
+        return self.cached(key, lambda: self.read_columns(name, columns, start, end))
+
+    def read_pickle(self, name):
+        df = pd.read_pickle(request_filename(name, 'pickle'), compression='gzip')
+        for column in TIMESTAMP_COLUMNS:
+            if column in df.columns and pd.api.types.is_string_dtype(df[column]):
+                df[column] = pd.to_datetime(df[column], format=TIMESTAMP_FORMAT)
+        return df
+
+    def read_columns(self, name, columns, start, end):
+        # the timestamp is needed for the range even if it is not requested
+        time_column = TIME_COLUMNS.get(name, 'timestamp')
+        read_columns = columns
+        if columns is not None and (start is not None or end is not None) and time_column not in columns:
+            read_columns = list(columns) + [time_column]
+
+        if self.output_format == 'shared':
+            return self.read_shared(name, columns, read_columns, start, end, time_column)
+        filename = request_filename(name, self.output_format)
+
+        if self.output_format == 'parquet':
+            filters = []
+            if start is not None:
+                filters.append((time_column, '>=', start))
+            if end is not None:
+                filters.append((time_column, '<', end))
+            df = pd.read_parquet(filename, columns=read_columns, filters=filters or None)
+            return df[columns] if columns is not None else df
+
+        import pyarrow.feather as feather
+        df = feather.read_table(filename, columns=read_columns, memory_map=True).to_pandas()
+        return self.select(df, columns, start, end, time_column)
+
+    def read_shared(self, name, columns, read_columns, start, end, time_column='timestamp'):
+        import pyarrow.compute as pc
+        from shared_tables import SHARED_DIR, attach_table
+        table = attach_table(name, self.shared_dir or SHARED_DIR, read_columns)
+        # the range is cut on the mapped table, only the selected rows are converted
+        if start is not None:
+            table = table.filter(pc.greater_equal(table[time_column], start))
+        if end is not None:
+            table = table.filter(pc.less(table[time_column], end))
+        df = table.to_pandas()
+        return df[columns] if columns is not None else df
+
+    @staticmethod
+    def select(df, columns, start, end, time_column='timestamp'):
+        if start is not None or end is not None:
+            mask = pd.Series(True, index=df.index)
+            if start is not None:
+                mask &= df[time_column] >= start
+            if end is not None:
+                mask &= df[time_column] < end
+            df = df[mask]
+        if columns is not None:
+            df = df[list(columns)]
+        return df if (start is None and end is None and columns is None) else df.reset_index(drop=True)
+
+    def path_detail(self):
+        '''
+        The per hop table of the path searches, derived from Path Movement Finished and result/path_routes.npz.
+        '''
+        from path_routes import load_routes, path_detail
+        if self.routes is None:
+            self.routes = load_routes()
+        return self.cached(('Path Movement Finished - Detail',),
+                           lambda: path_detail(self.table('Path Movement Finished'), self.routes))
+
+    def log_output(self, start=None, end=None):
+        '''
+        The combined log entries of combined_logs.py with start <= timestamp < end, columns 0-5 as in the notebook
+        with column 0 parsed. Only the hour folders of the range are read.
+        '''
+        start, end = to_timestamp(start), to_timestamp(end)
+
+        def load():
+            if os.path.isdir(COMBINED_DIR):
+                df = read_combined(start, end)
+                df.columns = range(6)
+                return df
+            if not os.path.exists(LOG_OUTPUT_FILE):
+                raise FileNotFoundError(f"Neither {COMBINED_DIR} nor {LOG_OUTPUT_FILE} exists, "
+                                        "run python extraction.py --combined or python combined_logs.py first")
+            with gzip.open(LOG_OUTPUT_FILE, 'rb') as f:
+                df = pd.DataFrame(pickle.load(f))
+            df[0] = pd.to_datetime(df[0], format=TIMESTAMP_FORMAT)
+            if start is not None:
+                df = df[df[0] >= start]
+            if end is not None:
+                df = df[df[0] < end]
+            return df.reset_index(drop=True)
+        return self.cached(('parsed_log_output', start, end), load)
@@ -1,12 +1,152 @@
 import os
 import re
 import gzip
+import heapq
 import time
+import argparse
+import json
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 import pandas as pd
 
+from alert_pipeline import BACKLOG_TABLE, PIPELINE_TABLE, track_alerts
+from log_reader import LogReader, read_lines
+from profiling import ExtractionProfile, PROFILE_FILE
+from records import RecordTable
+from request_latency import LATENCY_TABLE, PERCENTILE_TABLE, RequestPairer, pair_requests
+
 # Define timestamp pattern globally
 timestamp_pattern = re.compile(r'^\[(\d{4}\.\d{2}\.\d{2} \d{2}:\d{2}:\d{2}\.\d{3}) (\w) ([^\s\]]+) (\w+) ([^\]]+\]?)\]\s*(.*)$')
-unknown_content = []
+
+# Content patterns of the parsers, compiled once
+handle_request_start_pattern = re.compile(r'(START HANDLE REQUEST): (\w+) params: \[(.*?)\]')
+handle_request_end_pattern = re.compile(r'(END HANDLE REQUEST): (\w+) params: \[(.*?)\] result: (-?\d+) response time: (\w+)')
+execute_rbg_lam_pattern = re.compile(r'(.*?)TASK_ID: (\d+), TASK_TYPE: (\w+) CATEGORY: (\w+) LOCKED: (\w+) POINTS: (\d+) TELEGRAM_TYPE: (\w+) LAM: (\d+) INFO: (.+?) SUBTASKS=\[, (.*?)\](.+)?')
+execute_rbg_single_pattern = re.compile(r'(.*?)TASK_ID: (\d+), TASK_TYPE: (\w+) CATEGORY: (\w+) LOCKED: (\w+) POINTS: (\d+) TELEGRAM_TYPE: (\w+) LAM: (\d+) INFO: (.+?) LE: (\d+)(.+)?')
+execute_rbg_subtask_pattern = re.compile(r'.*? LE: (\d+)')
+execute_rbg_evaluated_pattern = re.compile(r'(RBG (\d+) EVALUATED): ')
+vb_pattern = re.compile(r'id=(\d+): VB ([^;]+); result=(\w+); info:\s*(.*)')
+vb_reserved_pattern = re.compile(r'#reserved=(\d+), #VBOK=(\d+)')
+vb_moving_pattern = re.compile(r'isMoving=(\w+), status=(\d+), requiredStatusBit=(\d+)')
+path_finished_pattern = re.compile(r'path search (finished) -- mfsId: (\d+); \[(\w+), (\[\[\[.*?\]\]\]|\[\]), (-?\d+)\]')
+path_hop_pattern = re.compile(r'\[\s*(\d+)\s*->\s*(\d+)\s*\]')
+path_failed_pattern = re.compile(r'path search (failed) -- mfsTrans: \[ mfs=(\d+), mfs-id=(\d+), (\d+) -> (\d+), checkLocal=(\d+), checkRemote=(\d+), distType=(\d+), saveWay=(\w+), minDist=(-?\d+) \] failcode: (-?\d+)')
+alert_received_pattern = re.compile(r'\s*Alert empfangen:\s*Name=([^ ]+)\s*Text=(.*)')
+alert_processing_pattern = re.compile(r'Start Alert-Verarbeitung: Alert=([^,]+),Lfdnr=(\d+),Text=(.*)')
+alert_handled_pattern = re.compile(r"Alert ([^ ]+) wurde verarbeitet\. Text: '(.*)' time: (\d+)\[ms\]")
+telegram_processed_pattern = re.compile(
+    r'TelegramDispatch processed - success: (\w+), alert: ([^,]+), '
+    r'text: (.*), telStructure: (.+)'
+)
+telegram_sent_pattern = re.compile(r"Alert ([^ ]+) wurde gesendet\. Text: '(.+)'")
+sequence_pattern = re.compile(r'sequence check (\w+). id=(\d+) is (\w+). returned=(-?\d+)')
+position_check_pattern = re.compile(r'CHECK_POSITION: LE id=(\d+) on position=(\d+), (seq=[^\s]+)')
+position_pattern = re.compile(r'LE id=(\d+): position=(\d+) is (.*)')
+nio_pattern = re.compile(r'id=(\d+): send to NIO=(\d+) (.*)')
+
+# Output tables in the order they are written to result/
+OUTPUT_TABLES = [
+    'Execute RBG',
+    'Start Handle Request',
+    'End Handle Request',
+    'Is VB OK',
+    'Path Movement Finished',
+    'Path Movement Failed',
+    'Unknown Content',
+    'Alerts Received',
+    'Alerts Processing',
+    'Alerts Handled',
+    'Telegrams Processed',
+    'Telegrams Sent',
+    'Check Sequence',
+    'Check Position',
+    'Get Set NIO',
+]
+
+MANIFEST_FILE = 'result/manifest.json'
+ALERT_PATTERNS_FILE = 'result/alert_patterns.txt'
+# Unknown Content rows handed to the unknown_sink of parse_log_lines at once
+UNKNOWN_BATCH = 10000
+OUTPUT_EXTENSIONS = {'pickle': '.pkl.gz', 'parquet': '.parquet', 'feather': '.feather'}
+
+# Typed output formats (parquet, feather): column -> dtype, columns not listed stay strings
+TIMESTAMP_FORMAT = '%Y.%m.%d %H:%M:%S.%f'
+PARQUET_ROW_GROUP_SIZE = 100000
+COLUMN_TYPES = {
+    'timestamp': 'datetime',
+    'end_timestamp': 'datetime',
+    'processing_timestamp': 'datetime',
+    'handled_timestamp': 'datetime',
+    'last_send_timestamp': 'datetime',
+    'first_seen': 'datetime',
+    'last_seen': 'datetime',
+    'info_code': 'category',
+    'thread': 'category',
+    'stage': 'category',
+    'task_type': 'category',
+    'category': 'category',
+    'telegram_type': 'category',
+    'info': 'category',
+    'fail_status': 'category',
+    'request': 'category',
+    'area': 'category',
+    'vb_status': 'category',
+    'search_status': 'category',
+    'sequence_status': 'category',
+    'id_status': 'category',
+    'alert_name': 'category',
+    'tel_structure': 'category',
+    'mfs_id': 'int',
+    'task_id': 'int',
+    'id': 'int',
+    'points': 'int',
+    'lam': 'int',
+    'reserved': 'int',
+    'vbok': 'int',
+    'info_status': 'int',
+    'requiredStatusBit': 'int',
+    'mfs': 'int',
+    'path_from': 'int',
+    'path_to': 'int',
+    'check_local': 'int',
+    'check_remote': 'int',
+    'dist_type': 'int',
+    'min_dist': 'int',
+    'failcode': 'int',
+    'returned': 'int',
+    'position': 'int',
+    'send_to': 'int',
+    'lfdnr': 'int',
+    'time_ms': 'int',
+    'order': 'int',
+    'from': 'int',
+    'to': 'int',
+    'response_time': 'ms',
+    'duration_ms': 'int',
+    'queue_ms': 'int',
+    'processing_ms': 'int',
+    'handler_ms': 'int',
+    'total_ms': 'int',
+    'retries': 'int',
+    'telegrams': 'int',
+    'lines': 'int',
+    'locked': 'bool',
+    'force_check': 'bool',
+    'moving': 'bool',
+    'save_way': 'bool',
+    'success': 'bool',
+    'timeout': 'bool',
+}
+# Columns with few distinct values, the parsed rows share one string per value (see records.py)
+INTERNED_COLUMNS = [column for column, column_type in COLUMN_TYPES.items() if column_type in ('category', 'bool')]
+# Columns with the same name but a different meaning in one table
+TABLE_COLUMN_TYPES = {
+    'End Handle Request': {'result': 'int'},
+    LATENCY_TABLE: {'result': 'int'},
+    PIPELINE_TABLE: {'status': 'category'},
+    'Is VB OK': {'result': 'bool'},
+    'Path Movement Finished': {'status': 'bool', 'code': 'int', 'route': 'int'},
+}
 
 def parse_handle_request(content):
     '''
@@ -16,10 +156,12 @@ def parse_handle_request(content):
     END HANDLE REQUEST: CHECK_SEQ params: [MF1, 1847608] result: 0 response time: 0ms
     END HANDLE REQUEST: CHECK_SEQ params: [MF2, 1847529, true] result: 1 response time: 0ms
     '''
-    m = re.match(r'(START HANDLE REQUEST): (\w+) params: \[(.*?)\]', content)
+    m = None
+    if content.startswith('START'):
+        m = handle_request_start_pattern.match(content)
+    elif content.startswith('END'):
+        m = handle_request_end_pattern.match(content)
     result = {}
-    if m is None:
-        m = re.match(r'(END HANDLE REQUEST): (\w+) params: \[(.*?)\] result: (-?\d+) response time: (\w+)', content)
 
     if m:
         result['stage'] = m[1]
@@ -47,18 +189,20 @@ def parse_execute_rbg(content):
     TASK_ID: 242, TASK_TYPE: LamTask CATEGORY: ON_TIME LOCKED: false POINTS: 807 TELEGRAM_TYPE: FS LAM: 1 INFO: LamTask - LAM(s)={1} SUBTASKS=[, SingleTask - LAM(s)={1} LE: 1847667, SingleTask - LAM(s)={1} LE: 1847668]
     TASK_ID: 240, TASK_TYPE: LamTask CATEGORY: ON_TIME LOCKED: true POINTS: 907 TELEGRAM_TYPE: FS LAM: 1 INFO: LamTask - LAM(s)={1} SUBTASKS=[, SingleTask - LAM(s)={1} LE: 1847717, SingleTask - LAM(s)={1} LE: 1847718] -- FAILURE: LamTask not allowed for UML transports. current LHM 1847717 [a_typ=UML] -- FAILURE: LamTask not allowed for UML transports. current LHM 1847717 [a_typ=UML]
     '''
-    pattern = re.compile(r'(.*?)TASK_ID: (\d+), TASK_TYPE: (\w+) CATEGORY: (\w+) LOCKED: (\w+) POINTS: (\d+) TELEGRAM_TYPE: (\w+) LAM: (\d+) INFO: (.+?) SUBTASKS=\[, (.*?)\](.+)?')
-    match = pattern.match(content)
     result = {}
     stage = task_id = task_type = category = locked = points = telegram_type = lam = info = le = fail_status = None
     les = []
+    match = None
+
+    # Cheap substring checks first, most lines only match one of the patterns
+    if 'SUBTASKS=[, ' in content:
+        match = execute_rbg_lam_pattern.match(content)
 
     if match:
         stage, task_id, task_type, category, locked, points, telegram_type, lam, info, les, fail_status = match.groups()
         les = les.split(', ')
-    else:
-        pattern = re.compile(r'(.*?)TASK_ID: (\d+), TASK_TYPE: (\w+) CATEGORY: (\w+) LOCKED: (\w+) POINTS: (\d+) TELEGRAM_TYPE: (\w+) LAM: (\d+) INFO: (.+?) LE: (\d+)(.+)?')
-        match = pattern.match(content)
+    elif 'TASK_ID: ' in content:
+        match = execute_rbg_single_pattern.match(content)
 
         if match:
             stage, task_id, task_type, category, locked, points, telegram_type, lam, info, le, fail_status = match.groups()
@@ -78,7 +222,7 @@ def parse_execute_rbg(content):
         else:
             result['le'] = ''
             for item in les:
-                m = re.match(r'.*? LE: (\d+)', item)
+                m = execute_rbg_subtask_pattern.match(item)
                 if m:
                     if result['le'] == '':
                         result['le'] = m[1]
@@ -87,8 +231,9 @@ def parse_execute_rbg(content):
         result['fail_status'] = fail_status
     else:
         # to capture "RBG 1 EVALUATED:" that always one before the whole executeRbg if stage is not "try execute task"
-        pattern = re.compile(r'(RBG (\d+) EVALUATED): ')
-        match = pattern.match(content)
+        match = None
+        if content.startswith('RBG '):
+            match = execute_rbg_evaluated_pattern.match(content)
         if match:
             result['stage'] = 'rbg'
             result['data'] = match.group(1)
@@ -106,9 +251,7 @@ def parse_vb(content):
     id=1847754: VB not OK; result=false; info: isMoving=true, status=2, requiredStatusBit=4
     id=1847014: VB not OK; result=false; info:
     '''
-    pattern = re.compile(r'id=(\d+): VB ([^;]+); result=(\w+); info:\s*(.*)')
-
-    match = pattern.match(content)
+    match = vb_pattern.match(content)
     result = {}
 
     if match:
@@ -123,7 +266,7 @@ def parse_vb(content):
             result['info_status'] = None
             result['requiredStatusBit'] = None
         else:
-            m = re.match(r'#reserved=(\d+), #VBOK=(\d+)', vb_info)
+            m = vb_reserved_pattern.match(vb_info)
             if m:
                 result['reserved'] = m.group(1)
                 result['vbok'] = m.group(2)
@@ -131,7 +274,7 @@ def parse_vb(content):
                 result['info_status'] = None
                 result['requiredStatusBit'] = None
             else:
-                m = re.match(r'isMoving=(\w+), status=(\d+), requiredStatusBit=(\d+)', vb_info)
+                m = vb_moving_pattern.match(vb_info)
                 if m:
                     result['reserved'] = None
                     result['vbok'] = None
@@ -152,26 +295,25 @@ def parse_path_movement(content):
     path search finished -- mfsId: 1847599; [false, [], -2]
     path search failed -- mfsTrans: [ mfs=1, mfs-id=1847599, 1631 -> 1716, checkLocal=63, checkRemote=8, distType=0, saveWay=true, minDist=0 ] failcode: -2
     '''
-    main_pattern = re.compile(r'path search (finished) -- mfsId: (\d+); \[(\w+), (\[\[\[.*?\]\]\]|\[\]), (-?\d+)\]')
-    match = main_pattern.match(content)
+    match = None
+    if content.startswith('path search finished'):
+        match = path_finished_pattern.match(content)
     result = {}
 
     if match:
         search_status, mfs_id, status, path_block, code = match.groups()
 
-        path_pattern = re.compile(r'\[\s*(\d+)\s*->\s*(\d+)\s*\]')
-        raw_paths = path_pattern.findall(path_block)
-
         result = {
             'search_status': search_status,
             'mfs_id': mfs_id,
             'status': status,
             'code': code,
-            'paths': [{'from': start, 'to': end} for start, end in raw_paths]
+            # ((from, to), ...), replaced by a route id before writing, see path_routes.py
+            'paths': tuple(path_hop_pattern.findall(path_block))
         }
     else:
-        main_pattern = re.compile(r'path search (failed) -- mfsTrans: \[ mfs=(\d+), mfs-id=(\d+), (\d+) -> (\d+), checkLocal=(\d+), checkRemote=(\d+), distType=(\d+), saveWay=(\w+), minDist=(-?\d+) \] failcode: (-?\d+)')
-        match = main_pattern.match(content)
+        if content.startswith('path search failed'):
+            match = path_failed_pattern.match(content)
 
         if match:
             search_status, mfs, mfs_id, path_from, path_to, check_local, check_remote, dist_type, save_way, min_dist, failcode = match.groups()
@@ -212,7 +354,7 @@ def parse_alert(content):
     }
 
     # 1) Alert empfangen
-    m1 = re.match(r'\s*Alert empfangen:\s*Name=([^ ]+)\s*Text=(.*)', content)
+    m1 = alert_received_pattern.match(content)
     if m1:
         result['stage'] = 'Alert empfangen'
         result['alert_name'] = m1.group(1)
@@ -220,10 +362,7 @@ def parse_alert(content):
         return result
 
     # 2) Start Alert-Verarbeitung
-    m2 = re.match(
-        r'Start Alert-Verarbeitung: Alert=([^,]+),Lfdnr=(\d+),Text=(.*)',
-        content
-    )
+    m2 = alert_processing_pattern.match(content)
     if m2:
         result['stage'] = 'Start Alert-Verarbeitung'
         result['alert_name'] = m2.group(1)
@@ -232,10 +371,7 @@ def parse_alert(content):
         return result
 
     # 3) Alert <NAME> wurde verarbeitet
-    m3 = re.match(
-        r"Alert ([^ ]+) wurde verarbeitet\. Text: '(.*)' time: (\d+)\[ms\]",
-        content
-    )
+    m3 = alert_handled_pattern.match(content)
     if m3:
         name = m3.group(1)
         result['stage'] = f'Alert {name} wurde verarbeitet'
@@ -266,11 +402,7 @@ def parse_telegram(content):
     }
 
     # 1) TelegramDispatch processed
-    m1 = re.match(
-        r'TelegramDispatch processed - success: (\w+), alert: ([^,]+), '
-        r'text: (.*), telStructure: (.+)',
-        content
-    )
+    m1 = telegram_processed_pattern.match(content)
     if m1:
         result['stage'] = 'TelegramDispatch processed'
         result['success'] = m1.group(1)
@@ -280,7 +412,7 @@ def parse_telegram(content):
         return result
 
     # 2) Alert <NAME> wurde gesendet
-    m2 = re.match(r"Alert ([^ ]+) wurde gesendet\. Text: '(.+)'", content)
+    m2 = telegram_sent_pattern.match(content)
     if m2:
         name = m2.group(1)
         result['stage'] = f'Alert {name} wurde gesendet'
@@ -296,8 +428,7 @@ def parse_telegram(content):
 
 
 def check_sequence(content):
-    pattern = re.compile(r'sequence check (\w+). id=(\d+) is (\w+). returned=(-?\d+)')
-    match = pattern.match(content)
+    match = sequence_pattern.match(content)
     result = {}
 
     if match:
@@ -314,8 +445,7 @@ def check_sequence(content):
 
 
 def check_position(content):
-    pattern = re.compile(r'CHECK_POSITION: LE id=(\d+) on position=(\d+), (seq=[^\s]+)')
-    match = pattern.match(content)
+    match = position_check_pattern.match(content)
     result = {}
     id = position = status = ''
     foundMatch = False
@@ -324,8 +454,7 @@ def check_position(content):
         id, position, status = match.groups()
         foundMatch = True
     else:
-        pattern = re.compile(r'LE id=(\d+): position=(\d+) is (.*)')
-        match = pattern.match(content)
+        match = position_pattern.match(content)
 
         if match:
             id, position, status = match.groups()
@@ -342,26 +471,9 @@ def check_position(content):
     return result
 
 
-def parse_path_detail(timestamp, mfs_id, paths):
-    result = []
-    order = 1
-    for path in paths:
-        new_path = {
-            'timestamp': timestamp,
-            'mfs_id': mfs_id,
-            'order': order,
-            'from': path['from'],
-            'to': path['to']
-        }
-        result.append(new_path)
-        order += 1
-
-    return result
-
 def getset_nio(content):
     'id=1857866: send to NIO=1746 (AUSSCHLEUSEN)'
-    pattern = re.compile(r'id=(\d+): send to NIO=(\d+) (.*)')
-    match = pattern.match(content)
+    match = nio_pattern.match(content)
     result = {}
 
     if match:
@@ -376,9 +488,7 @@ def getset_nio(content):
     return result
 
 
-def collect_and_sort_log_lines(folder, max_files=None):
-    timestamped_lines = []
-
+def find_log_files(folder, max_files=None):
     files = []
     for root, _, fs in os.walk(folder):
         for file in fs:
@@ -390,193 +500,849 @@ def collect_and_sort_log_lines(folder, max_files=None):
     if max_files:
         files = sorted(files)[:max_files]
 
+    return files
+
+
+def read_log_file(file_path, reader=None):
+    '''
+    Returns the (timestamp, line) tuples of one log file in timestamp order.
+    With a LogReader the file was already inflated in the background.
+    '''
+    return sort_log_lines(reader.lines(file_path) if reader is not None else read_lines(file_path))
+
+
+def sort_log_lines(lines):
+    '''
+    Returns the (timestamp, line) tuples of the lines with a timestamp header in timestamp order.
+    The hourly files are normally already sorted, so the sort only runs when an out-of-order line is found.
+    '''
+    timestamped_lines = []
+    is_sorted = True
+    last_timestamp = ''
+
+    for line in lines:
+        m = timestamp_pattern.match(line)
+        if m:
+            timestamp = m.group(1)
+            if timestamp < last_timestamp:
+                is_sorted = False
+            last_timestamp = timestamp
+            timestamped_lines.append((timestamp, line))
+
+    if not is_sorted:
+        timestamped_lines.sort(key=lambda x: x[0])
+    return timestamped_lines
+
+
+def first_timestamp(file_path):
+    # only the start of the file is inflated
+    open_func = gzip.open if file_path.endswith('.gz') else open
+    with open_func(file_path, 'rt', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            m = timestamp_pattern.match(line)
+            if m:
+                return m.group(1)
+    return None
+
+
+def sort_log_files(files):
+    '''
+    Returns (first timestamp, file path) tuples ordered by the timestamp of the first log line.
+    Files without any log line are dropped.
+    '''
+    starts = []
     for file_path in files:
-        open_func = gzip.open if file_path.endswith('.gz') else open
-        with open_func(file_path, 'rt', encoding='utf-8', errors='ignore') as f:
-            for line in f:
-                m = timestamp_pattern.match(line)
-                if m:
-                    timestamp = m.group(1)
-                    timestamped_lines.append((timestamp, line))
+        timestamp = first_timestamp(file_path)
+        if timestamp is not None:
+            starts.append((timestamp, file_path))
+    starts.sort()
+    return starts
+
+
+def stream_sorted_log_lines(folder, max_files=None):
+    '''
+    Generator version of collect_and_sort_log_lines.
+    '''
+    return merge_log_files(find_log_files(folder, max_files))
+
+
+def merge_log_files(files):
+    '''
+    Yields the lines of the files in timestamp order.
+    Every file is sorted on its own and the files are combined with a heap-based k-way merge.
+    A file is only loaded once the merge reaches its first timestamp or the file before it is loaded, so for the
+    hourly files (which do not overlap) two files are held in memory at a time.
+    '''
+    pending = sort_log_files(files)
+    # the files are opened in this order, the next ones are inflated while one is merged
+    reader = LogReader([file_path for _, file_path in pending])
+
+    heap = []
+    next_file = 0
+    try:
+        while next_file < len(pending) or heap:
+            # Open every file that may start before the smallest line in the heap, and always the next one:
+            # the first line of a file is not always its earliest, the sorted lines of the next file are
+            # merged before the current file runs out
+            while next_file < len(pending) and (len(heap) < 2 or pending[next_file][0] <= heap[0][0]):
+                lines = iter(read_log_file(pending[next_file][1], reader))
+                first = next(lines, None)
+                if first:
+                    heapq.heappush(heap, (first[0], next_file, first[1], lines))
+                next_file += 1
+
+            if not heap:
+                continue
+            timestamp, order, line, lines = heap[0]
+            yield line
+
+            following = next(lines, None)
+            if following:
+                heapq.heapreplace(heap, (following[0], order, following[1], lines))
+            else:
+                heapq.heappop(heap)
+    finally:
+        reader.close()
+
+
+def collect_and_sort_log_lines(folder, max_files=None):
+    timestamped_lines = []
+
+    files = find_log_files(folder, max_files)
+    reader = LogReader(files)
+    for file_path in files:
+        timestamped_lines.extend(read_log_file(file_path, reader))
+    reader.close()
 
     # Sort all collected lines by timestamp
     timestamped_lines.sort(key=lambda x: x[0])
     return [line for _, line in timestamped_lines]
 
 
-def add_to_unknown(function_name, parsed):
+def log_entries(lines):
+    '''
+    Returns the log entries of the lines in timestamp order, as tuples of the timestamp_pattern groups
+    (timestamp, info_code, thread, operation_num, function, content).
+    Lines without a timestamp header are continuation lines (stack traces, multi-line dumps), they are added to the
+    content of the entry before them as in combined_logs.py and follow.py. Lines before the first header are dropped.
+    '''
+    entries = []
+    continuation = []
+    is_sorted = True
+    last_timestamp = ''
+
+    for line in lines:
+        m = timestamp_pattern.match(line)
+        if m:
+            if continuation:
+                entries[-1] = add_continuation(entries[-1], continuation)
+                continuation = []
+            entry = m.groups()
+            if entry[0] < last_timestamp:
+                is_sorted = False
+            last_timestamp = entry[0]
+            entries.append(entry)
+        elif entries:
+            continuation.append(line)
+    if continuation:
+        entries[-1] = add_continuation(entries[-1], continuation)
+
+    if not is_sorted:
+        # stable, an entry keeps its place among entries with the same timestamp
+        entries.sort(key=lambda entry: entry[0])
+    return entries
+
+
+def add_continuation(entry, lines):
+    return entry[:5] + ((entry[5] + '\n' + ''.join(lines)).rstrip('\n'),)
+
+
+def read_log_entries(file_path, reader=None, line_sinks=()):
+    '''
+    Returns the entries of one log file in timestamp order, see log_entries.
+    Every line sink is called once with all lines of the file before they are grouped into entries.
+    '''
+    lines = reader.lines(file_path) if reader is not None else read_lines(file_path)
+    for line_sink in line_sinks:
+        line_sink(lines)
+    return log_entries(lines)
+
+
+def merge_log_entries(files, line_sinks=()):
+    '''
+    Yields the entries of the files in timestamp order, like merge_log_files does for the lines.
+    Every file is read, inflated and header-parsed once, its lines also go to the line sinks.
+    '''
+    pending = sort_log_files(files)
+    reader = LogReader([file_path for _, file_path in pending])
+
+    heap = []
+    next_file = 0
+    try:
+        while next_file < len(pending) or heap:
+            # the next file is always open, see merge_log_files
+            while next_file < len(pending) and (len(heap) < 2 or pending[next_file][0] <= heap[0][0]):
+                entries = iter(read_log_entries(pending[next_file][1], reader, line_sinks))
+                first = next(entries, None)
+                if first:
+                    heapq.heappush(heap, (first[0], next_file, first, entries))
+                next_file += 1
+
+            if not heap:
+                continue
+            timestamp, order, entry, entries = heap[0]
+            yield entry
+
+            following = next(entries, None)
+            if following:
+                heapq.heapreplace(heap, (following[0], order, following, entries))
+            else:
+                heapq.heappop(heap)
+    finally:
+        reader.close()
+
+
+def add_to_unknown(unknown_content, function_name, parsed):
     parsed['stage'] = function_name
     unknown_content.append(parsed)
 
 
-def write_request(data, function_name):
-    filename = 'result/' + function_name + '.pkl.gz'
-    df = pd.DataFrame(data)  # Convert list of dicts to DataFrame
-    df.to_pickle(filename, compression='gzip')
+def to_bool(value):
+    if isinstance(value, bool):
+        return value
+    if value == 'true':
+        return True
+    if value == 'false':
+        return False
+    return None
 
 
-if __name__ == '__main__':
-    start_time = time.time() # Start timing
+def convert_types(df, function_name):
+    '''
+    Converts the string columns of one output table into their dtypes, see COLUMN_TYPES.
+    '''
+    column_types = dict(COLUMN_TYPES)
+    column_types.update(TABLE_COLUMN_TYPES.get(function_name, {}))
+
+    for column, column_type in column_types.items():
+        if column not in df.columns:
+            continue
+        if column_type == 'datetime':
+            df[column] = pd.to_datetime(df[column], format=TIMESTAMP_FORMAT)
+        elif column_type == 'int':
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype('Int64')
+        elif column_type == 'ms':
+            # response time like "15ms"
+            df[column] = pd.to_numeric(df[column].str.removesuffix('ms'), errors='coerce').astype('Int64')
+        elif column_type == 'bool':
+            df[column] = df[column].map(to_bool).astype('boolean')
+        elif column_type == 'category':
+            df[column] = df[column].astype('category')
+
+    if 'timestamp' in df.columns:
+        df = df.sort_values('timestamp', kind='stable', ignore_index=True)
+    return df
+
+
+def request_filename(function_name, output_format):
+    if output_format not in OUTPUT_EXTENSIONS:
+        raise ValueError(f"Unknown output format '{output_format}'")
+    return 'result/' + function_name + OUTPUT_EXTENSIONS[output_format]
+
+
+def read_request(function_name, output_format='pickle'):
+    filename = request_filename(function_name, output_format)
+    if output_format == 'pickle':
+        return pd.read_pickle(filename, compression='gzip')
+    elif output_format == 'parquet':
+        return pd.read_parquet(filename)
+    else:
+        return pd.read_feather(filename)
 
-    start_handle_req = []
-    end_handle_req = []
-    execute_rbg = []
-    is_vb_ok = []
-    path_movement_finished = []
-    path_detail = []
-    path_movement_failed = []
-    sequence = []
-    position = []
-    alerts_received = []
-    alerts_processing = []
-    alerts_handled = []
-    alerts_unknown = []
-    telegrams_processed = []
-    telegrams_sent = []
-    telegrams_unknown = []
-    nio = []
-
-    # Use max_files to debug, use None for full set
-    # sorted_lines = collect_and_sort_log_lines("rawdata", max_files=50)
-    sorted_lines = collect_and_sort_log_lines("rawdata")
-
-    for line in sorted_lines:
-        ts_match = timestamp_pattern.match(line)
-        if ts_match:
-            timestamp, info_code, thread, operation_num, function, content = ts_match.groups()
-            function_name = function.split(".")[len(function.split(".")) - 1]
-
-            # Start every dict with timestamp, info_code, thread and worker id
-            parsed = {'timestamp': timestamp, 'info_code': info_code, 'thread': thread, 'operation_num': operation_num}
-
-            # For every function, update the parsed dict with the return
-            # and append the respective list
-            # If not matched with regex in the function, should append to unknown by returning 'stage' and 'data'
-            try:
-                if function_name == 'executeRbg':
-                    parsed.update(parse_execute_rbg(content))
-                    if parsed['stage'] == 'unknown':
-                        add_to_unknown(function_name, parsed)
-                    elif parsed['stage'] == 'rbg':
-                        rbg_stage = content
-                    else:
-                        if parsed['stage'] == '':
-                            parsed['stage'] = rbg_stage
-                        execute_rbg.append(parsed)
-
-                elif function_name == 'handleRequest':
-                    parsed.update(parse_handle_request(content))
-                    if parsed['stage'] == 'START HANDLE REQUEST':
-                        start_handle_req.append(parsed)
-                    elif parsed['stage'] == 'END HANDLE REQUEST':
-                        end_handle_req.append(parsed)
-                    else:
-                        add_to_unknown(function_name, parsed)
 
-                elif function_name == 'isVBOK':
-                    parsed.update(parse_vb(content))
-                    if parsed['id']:
-                        is_vb_ok.append(parsed)
-                    else:
-                        add_to_unknown(function_name, parsed)
-
-                elif function_name == 'getPathForMovement':
-                    parsed.update(parse_path_movement(content))
-                    if parsed['search_status'] == 'finished':
-                        path_detail.extend(parse_path_detail(parsed['timestamp'], parsed['mfs_id'], parsed['paths']))
-                        path_movement_finished.append(parsed)
-                    elif parsed['search_status'] == 'failed':
-                        path_movement_failed.append(parsed)
-                    else:
-                        add_to_unknown(function_name, parsed)
+def write_frame(df, function_name, output_format='pickle'):
+    filename = request_filename(function_name, output_format)
+    if output_format == 'pickle':
+        df.to_pickle(filename, compression='gzip')
+    elif output_format == 'parquet':
+        # Row groups are sorted by timestamp, so time range filters only read the matching groups
+        df.to_parquet(filename, index=False, row_group_size=PARQUET_ROW_GROUP_SIZE)
+    else:
+        # Uncompressed so the file can be memory mapped without copying
+        df.to_feather(filename, compression='uncompressed')
 
-                elif function_name == 'checkSequence':
-                    parsed.update(check_sequence(content))
-                    if parsed['sequence_status']:
-                        sequence.append(parsed)
-                    else:
-                        add_to_unknown(function_name, parsed)
 
-                elif function_name == 'isPositionOK':
-                    parsed.update(check_position(content))
-                    if parsed['id']:
-                        position.append(parsed)
-                    else:
-                        add_to_unknown(function_name, parsed)
+def request_frame(data, function_name, output_format='pickle'):
+    # Parsed tables come as RecordTable, the other tables as list of dicts
+    df = data.to_frame() if isinstance(data, RecordTable) else pd.DataFrame(data)
+    if output_format != 'pickle':
+        df = convert_types(df, function_name)
+    return df
 
-                elif function_name == 'mainLoop':
-                    parsed.update(parse_alert(content))
-                    if parsed['stage'] == 'Alert empfangen':
-                        alerts_received.append(parsed)
-                    else:
-                        add_to_unknown(function_name, parsed)
 
-                elif function_name == 'processAlert':
-                    parsed.update(parse_alert(content))
-                    if parsed['stage'] == 'Start Alert-Verarbeitung':
-                        alerts_processing.append(parsed)
-                    else:
-                        add_to_unknown(function_name, parsed)
+def write_request(data, function_name, output_format='pickle'):
+    df = request_frame(data, function_name, output_format)
+    write_frame(df, function_name, output_format)
+    return df
 
-                elif function_name == 'alertHandler()':
-                    parsed.update(parse_alert(content))
-                    # matches "Alert <NAME> wurde verarbeitet"
-                    if parsed['stage'].startswith('Alert') and 'wurde verarbeitet' in parsed['stage']:
-                        alerts_handled.append(parsed)
-                    else:
-                        add_to_unknown(function_name, parsed)
 
-                # --- TELEGRAM HANDLING ---
-                elif function_name == 'fmRbgTelDisp':
-                    parsed.update(parse_telegram(content))
-                    if parsed['stage'] == 'TelegramDispatch processed':
-                        telegrams_processed.append(parsed)
-                    else:
-                        add_to_unknown(function_name, parsed)
+def append_request(data, function_name, output_format='pickle'):
+    '''
+    Appends the rows to an output table written by an earlier run.
+    Returns the whole table, None if there were no rows to append.
+    '''
+    if not os.path.exists(request_filename(function_name, output_format)):
+        return write_request(data, function_name, output_format)
+    if len(data) == 0:
+        return None
+
+    existing = read_request(function_name, output_format)
+    df = request_frame(data, function_name, output_format)
+
+    # New files normally start after the processed ones, only sort if they overlap
+    needs_sort = len(existing) > 0 and 'timestamp' in df.columns and df['timestamp'].iloc[0] < existing['timestamp'].iloc[-1]
+    df = pd.concat([existing, df], ignore_index=True)
+    for column in existing.columns:
+        if isinstance(existing[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype('category')
+    if needs_sort:
+        df = df.sort_values('timestamp', kind='stable', ignore_index=True)
+    write_frame(df, function_name, output_format)
+    return df
+
+
+def replace_rows(existing, df, dropped=(), key='timestamp'):
+    '''
+    Joins the rows of an output table written by an earlier run, without the rows at the positions dropped, and
+    the new rows df in key order, earlier rows first for the same key.
+    Returns the table and the positions of the rows of df in it.
+    '''
+    existing = existing.drop(index=existing.index[list(dropped)]).reset_index(drop=True)
+    df = pd.concat([existing, df], ignore_index=True)
+    for column in existing.columns:
+        if isinstance(existing[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype('category')
+    order = df[key].sort_values(kind='stable').index
+    positions = pd.Series(range(len(df)), index=order).sort_index()
+    return df.loc[order].reset_index(drop=True), positions.iloc[len(existing):].tolist()
+
+
+# Handlers get the parsed dict with the header fields and the content of one line,
+# update the dict with the return of their parser and append it to the respective list.
+# They return False if the regex in the parser did not match, the line then goes to unknown.
+def handle_execute_rbg(parsed, content, results, state):
+    parsed.update(parse_execute_rbg(content))
+    if parsed['stage'] == 'unknown':
+        return False
+    if parsed['stage'] == 'rbg':
+        state['rbg_stage'] = content
+    else:
+        if parsed['stage'] == '':
+            # None marks rows that need the rbg_stage of the previous file, see merge_results
+            parsed['stage'] = state['rbg_stage']
+        results['Execute RBG'].append(parsed)
+    return True
+
+
+def handle_request(parsed, content, results, state):
+    parsed.update(parse_handle_request(content))
+    if parsed['stage'] == 'START HANDLE REQUEST':
+        results['Start Handle Request'].append(parsed)
+    elif parsed['stage'] == 'END HANDLE REQUEST':
+        results['End Handle Request'].append(parsed)
+    else:
+        return False
+    return True
 
-                elif function_name == 'send':
-                    parsed.update(parse_telegram(content))
-                    # matches "Alert <NAME> wurde gesendet"
-                    if parsed['stage'].startswith('Alert') and 'wurde gesendet' in parsed['stage']:
-                        telegrams_sent.append(parsed)
-                    else:
-                        add_to_unknown(function_name, parsed)
 
-                elif function_name == 'getAndSetNioDestination':
-                    parsed.update(getset_nio(content))
-                    if parsed['id']:
-                        nio.append(parsed)
-                    else:
-                        add_to_unknown(function_name, parsed)
+def handle_vb(parsed, content, results, state):
+    parsed.update(parse_vb(content))
+    if not parsed['id']:
+        return False
+    results['Is VB OK'].append(parsed)
+    return True
 
-                else:
-                    # anything else
-                    parsed['stage'] = function_name
-                    parsed['data'] = content
-                    add_to_unknown(function_name, parsed)
+
+def handle_path_movement(parsed, content, results, state):
+    parsed.update(parse_path_movement(content))
+    if parsed['search_status'] == 'finished':
+        results['Path Movement Finished'].append(parsed)
+    elif parsed['search_status'] == 'failed':
+        results['Path Movement Failed'].append(parsed)
+    else:
+        return False
+    return True
+
+
+def handle_sequence(parsed, content, results, state):
+    parsed.update(check_sequence(content))
+    if not parsed['sequence_status']:
+        return False
+    results['Check Sequence'].append(parsed)
+    return True
+
+
+def handle_position(parsed, content, results, state):
+    parsed.update(check_position(content))
+    if not parsed['id']:
+        return False
+    results['Check Position'].append(parsed)
+    return True
+
+
+def handle_alert_received(parsed, content, results, state):
+    parsed.update(parse_alert(content))
+    if parsed['stage'] != 'Alert empfangen':
+        return False
+    results['Alerts Received'].append(parsed)
+    return True
+
+
+def handle_alert_processing(parsed, content, results, state):
+    parsed.update(parse_alert(content))
+    if parsed['stage'] != 'Start Alert-Verarbeitung':
+        return False
+    results['Alerts Processing'].append(parsed)
+    return True
+
+
+def handle_alert_handled(parsed, content, results, state):
+    parsed.update(parse_alert(content))
+    # matches "Alert <NAME> wurde verarbeitet"
+    if not (parsed['stage'].startswith('Alert') and 'wurde verarbeitet' in parsed['stage']):
+        return False
+    results['Alerts Handled'].append(parsed)
+    return True
+
+
+def handle_telegram_processed(parsed, content, results, state):
+    parsed.update(parse_telegram(content))
+    if parsed['stage'] != 'TelegramDispatch processed':
+        return False
+    results['Telegrams Processed'].append(parsed)
+    return True
+
+
+def handle_telegram_sent(parsed, content, results, state):
+    parsed.update(parse_telegram(content))
+    # matches "Alert <NAME> wurde gesendet"
+    if not (parsed['stage'].startswith('Alert') and 'wurde gesendet' in parsed['stage']):
+        return False
+    results['Telegrams Sent'].append(parsed)
+    return True
+
+
+def handle_nio(parsed, content, results, state):
+    parsed.update(getset_nio(content))
+    if not parsed['id']:
+        return False
+    results['Get Set NIO'].append(parsed)
+    return True
+
+
+# Last part of the logger function name -> handler, anything else goes to unknown
+HANDLERS = {
+    'executeRbg': handle_execute_rbg,
+    'handleRequest': handle_request,
+    'isVBOK': handle_vb,
+    'getPathForMovement': handle_path_movement,
+    'checkSequence': handle_sequence,
+    'isPositionOK': handle_position,
+    'mainLoop': handle_alert_received,
+    'processAlert': handle_alert_processing,
+    'alertHandler()': handle_alert_handled,
+    'fmRbgTelDisp': handle_telegram_processed,
+    'send': handle_telegram_sent,
+    'getAndSetNioDestination': handle_nio,
+}
+
+
+def parse_entry(timestamp, info_code, thread, operation_num, function, content, results, state):
+    '''
+    Parses one log entry, the arguments are the groups of timestamp_pattern
+    but content may also include continuation lines.
+    '''
+    function_name = function.rsplit(".", 1)[-1]
+
+    # Start every dict with timestamp, info_code, thread and worker id
+    parsed = {'timestamp': timestamp, 'info_code': info_code, 'thread': thread, 'operation_num': operation_num}
+
+    handler = HANDLERS.get(function_name)
+    try:
+        if handler is None:
+            # anything else
+            parsed['stage'] = function_name
+            parsed['data'] = content
+            add_to_unknown(results['Unknown Content'], function_name, parsed)
+        elif not handler(parsed, content, results, state):
+            add_to_unknown(results['Unknown Content'], function_name, parsed)
+
+    except Exception as e:
+        print(f"Error parsing function '{function_name}' at {timestamp}: {e}")
+        raise
+
+
+def new_results():
+    return {name: RecordTable(INTERNED_COLUMNS) for name in OUTPUT_TABLES}
+
+
+def parse_log_lines(lines, rbg_stage=None, unknown_sink=None):
+    '''
+    Parses log lines into one RecordTable per output table, see log_entries and parse_log_entries.
+    '''
+    return parse_log_entries(log_entries(lines), rbg_stage, unknown_sink)
+
+
+def parse_log_entries(entries, rbg_stage=None, unknown_sink=None, entry_sinks=()):
+    '''
+    Parses log entries in timestamp order into one RecordTable per output table.
+    rbg_stage is the last "RBG n EVALUATED" content seen before these entries, it is None when unknown.
+    If unknown_sink is given, the Unknown Content rows are handed to it every UNKNOWN_BATCH rows
+    instead of being kept in the results. Every entry is also handed to the entry sinks.
+    Returns the dict of RecordTables and the rbg_stage after the last entry.
+    '''
+    results = new_results()
+    state = {'rbg_stage': rbg_stage}
+    unknown = results['Unknown Content']
+
+    for entry in entries:
+        parse_entry(*entry, results, state)
+        for entry_sink in entry_sinks:
+            entry_sink(entry)
+        if unknown_sink is not None and len(unknown) >= UNKNOWN_BATCH:
+            unknown_sink(unknown)
+            unknown.clear()
+
+    if unknown_sink is not None:
+        unknown_sink(unknown)
+        unknown.clear()
+    return results, state['rbg_stage']
 
 
-            except Exception as e:
-                print(f"Error parsing function '{function_name}' at {timestamp}: {e}")
-                exit(1)
+def parse_log_file(file_path):
+    return parse_log_entries(read_log_entries(file_path))
+
+
+def merge_results(file_results, rbg_stage=None):
+    '''
+    Merges the parse_log_file results of several files (ordered by their first timestamp)
+    into one timestamp ordered RecordTable per output table.
+    Rows parsed before the first "RBG n EVALUATED" line of a file get the rbg_stage of the previous file.
+    Returns the merged dict of RecordTables and the rbg_stage after the last file.
+    '''
+    for results, file_rbg_stage in file_results:
+        stages = results['Execute RBG'].columns.get('stage', [])
+        for k, stage in enumerate(stages):
+            if stage is None:
+                stages[k] = rbg_stage
+        if file_rbg_stage is not None:
+            rbg_stage = file_rbg_stage
+
+    merged = {}
+    for name in OUTPUT_TABLES:
+        merged[name] = RecordTable.merge([results[name] for results, _ in file_results])
+    return merged, rbg_stage
+
+
+def parse_and_mine(parse_file, file_path):
+    '''
+    parse_file of one file, its Unknown Content rows are clustered into templates and counted for the rollups
+    where they are parsed. Returns the results without those rows, the rbg_stage, the TemplateMiner and the
+    count_rows cells of the file.
+    '''
+    # templates and rollups import this module
+    from templates import TemplateMiner
+    from rollups import count_rows
+    results, rbg_stage = parse_file(file_path)
+    unknown = results['Unknown Content']
+    miner = TemplateMiner()
+    miner.add_rows(unknown)
+    cells = count_rows(unknown, 'Unknown Content')
+    unknown.clear()
+    return results, rbg_stage, miner, cells
+
+
+def parse_parallel(files, workers, rbg_stage=None, parse_file=parse_log_file, miner=None, unknown_cells=None):
+    '''
+    Parses the files in worker processes and merges their results, see merge_results.
+    With a miner the Unknown Content rows are mined per file in the workers (parse_and_mine), only the templates and
+    the rollup counts come back and are merged into miner and unknown_cells, in the order of the files.
+    '''
+    files = [file_path for _, file_path in sort_log_files(files)]
+    if miner is not None:
+        parse_file = partial(parse_and_mine, parse_file)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            file_results = list(executor.map(parse_file, files))
+    else:
+        file_results = [parse_file(file_path) for file_path in files]
+    if miner is not None:
+        from rollups import merge_cells
+        for _, _, file_miner, cells in file_results:
+            miner.merge(file_miner)
+            merge_cells(unknown_cells, cells)
+        file_results = [(results, file_rbg_stage) for results, file_rbg_stage, _, _ in file_results]
+    return merge_results(file_results, rbg_stage)
+
+
+def file_signature(file_path):
+    stat = os.stat(file_path)
+    return {'size': stat.st_size, 'mtime': int(stat.st_mtime)}
+
+
+def load_manifest():
+    if not os.path.exists(MANIFEST_FILE):
+        return None
+    with open(MANIFEST_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(processed, rbg_stage, output_format, alert_state=None):
+    # alert_state: the alerts that were open after the last file, see AlertTracker.state
+    manifest = {'format': output_format, 'rbg_stage': rbg_stage, 'files': processed, 'alert_state': alert_state}
+    with open(MANIFEST_FILE, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+
+def new_log_files(manifest, files):
+    '''
+    Returns the files that are not in the manifest yet.
+    Returns None if an already processed file changed, then everything has to be parsed again.
+    '''
+    new_files = []
+    for file_path in files:
+        signature = manifest['files'].get(os.path.basename(file_path))
+        if signature is None:
+            new_files.append(file_path)
+        elif signature != file_signature(file_path):
+            return None
+    return new_files
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Extract the MFS log lines into one table per logger function')
+    parser.add_argument('--folder', default='rawdata', help='folder with the MFS-*.log.gz files')
+    parser.add_argument('--max-files', type=int, default=None, help='only parse the first n files, for debugging')
+    parser.add_argument('--workers', type=int, default=1, help='parse the hourly files in n processes')
+    parser.add_argument('--format', default='pickle', choices=['pickle', 'parquet', 'feather'],
+                        help='pickle writes gzip pickles of strings, parquet and feather write typed columns')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only parse the files that are not in result/manifest.json and append their rows')
+    parser.add_argument('--profile', action='store_true',
+                        help='write stage, logger function and output table timings to result/profile.json')
+    parser.add_argument('--keep-unknown', action='store_true',
+                        help='also write every Unknown Content row, not only the templates in Unknown Templates')
+    parser.add_argument('--request-timeout', type=int, default=60,
+                        help='seconds after which a START HANDLE REQUEST without END counts as a timeout')
+    parser.add_argument('--alert-window', type=int, default=120,
+                        help='seconds after which a received alert that was not handled counts as a timeout')
+    parser.add_argument('--shared', nargs='?', const='', default=None, metavar='DIR',
+                        help='also publish the tables as Arrow files in shared memory (default /dev/shm/mfs-results) '
+                             'and write result/ in the background')
+    parser.add_argument('--no-persist', action='store_true',
+                        help='with --shared, only publish the tables and write nothing to result/ but the rollups')
+    parser.add_argument('--combined', action='store_true',
+                        help='also write the combined log of combined_logs.py to result/combined_log')
+    parser.add_argument('--alerts', action='store_true',
+                        help='also write the alert lines of alert_extract.py to result/alert_patterns.txt')
+    args = parser.parse_args()
+    if (args.combined or args.alerts) and args.workers > 1:
+        parser.error('--combined and --alerts need the serial reader, they do not work with --workers')
+    if args.no_persist and (args.shared is None or args.incremental):
+        parser.error('--no-persist needs --shared and does not work with --incremental')
+
+    start_time = time.time() # Start timing
+    profile = ExtractionProfile()
+    if args.profile:
+        # Per line timing is only measured in this process, not in the workers
+        if args.workers == 1:
+            profile.wrap_handlers(HANDLERS)
+            profile.wrap_function(globals(), 'read_log_entries')
+        profile.wrap_function(globals(), 'write_frame')
+
+    with profile.stage('find_log_files'):
+        files = find_log_files(args.folder, args.max_files)
+    processed = {}
+    rbg_stage = None
+    alert_state = None
+    append = False
+
+    manifest = load_manifest() if args.incremental else None
+    if manifest is not None and manifest['format'] != args.format:
+        print(f"Results were written as {manifest['format']}, parsing everything again")
+    elif manifest is not None:
+        new_files = new_log_files(manifest, files)
+        if new_files is None:
+            print("Already processed log files changed, parsing everything again")
+        else:
+            print(f"{len(new_files)} new of {len(files)} log files")
+            files = new_files
+            processed = manifest['files']
+            rbg_stage = manifest['rbg_stage']
+            alert_state = manifest.get('alert_state')
+            append = True
+
+    # Unknown Content is clustered into templates while parsing, the rows themselves are only kept with --keep-unknown
+    from templates import TEMPLATE_TABLE, TemplateMiner
+    from rollups import count_rows
+    miner = TemplateMiner()
+    if append and os.path.exists(request_filename(TEMPLATE_TABLE, args.format)):
+        miner.load(read_request(TEMPLATE_TABLE, args.format).to_dict('records'))
+    unknown_cells = {}
+
+    def mine_unknown(rows):
+        miner.add_rows(rows)
+        count_rows(rows, 'Unknown Content', unknown_cells)
+
+    unknown_sink = None if args.keep_unknown else mine_unknown
+    # the workers mine their own Unknown Content rows
+    parallel_miner = None if args.keep_unknown else miner
+    if unknown_sink is not None and not append and os.path.exists(request_filename('Unknown Content', args.format)):
+        # the dump of an earlier --keep-unknown run would not match the new tables
+        os.remove(request_filename('Unknown Content', args.format))
+
+    # read_log_entries (gzip, header regex, sort per file) runs inside this stage
+    with profile.stage('read_and_parse'):
+        if args.workers > 1:
+            results, rbg_stage = parse_parallel(files, args.workers, rbg_stage, miner=parallel_miner,
+                                                unknown_cells=unknown_cells)
+        else:
+            # Entries are merged and handed over one by one. Every file is read and header-parsed once,
+            # the combined log and the alert scan get the same lines and entries as the parsers.
+            line_sinks, entry_sinks = [], []
+            if args.combined:
+                from combined_logs import CombinedLogWriter
+                combined = CombinedLogWriter(append=append)
+                entry_sinks.append(combined.add)
+            if args.alerts:
+                from alert_extract import add_alert_lines
+                alert_patterns = set()
+                line_sinks.append(lambda lines: add_alert_lines(lines, alert_patterns))
+            results, rbg_stage = parse_log_entries(merge_log_entries(files, line_sinks), rbg_stage, unknown_sink,
+                                                   entry_sinks)
+        if args.keep_unknown:
+            mine_unknown(results['Unknown Content'])
+
+    if args.combined:
+        combined.close()
+    if args.alerts:
+        from alert_extract import save_alert_patterns
+        if append and os.path.exists(ALERT_PATTERNS_FILE):
+            with open(ALERT_PATTERNS_FILE, 'r', encoding='utf-8') as f:
+                alert_patterns.update(line.rstrip('\n') for line in f)
+        save_alert_patterns(alert_patterns, ALERT_PATTERNS_FILE)
+
+    with profile.stage('encode_routes'):
+        # Imported here, path_routes and le_index import numpy
+        from path_routes import encode_routes, load_route_dict, save_routes
+        routes = encode_routes(results['Path Movement Finished'], load_route_dict() if append else None)
+        save_routes(routes)
+
+    # With --shared the typed tables are published to shared memory first, analysis processes can attach to them
+    # while result/ is still written in the background. Appending reads the earlier tables, so it stays in this thread.
+    if args.shared is not None:
+        # Imported here, pyarrow is only needed for this option
+        from shared_tables import SHARED_DIR, AsyncPersister, publish_table, save_catalog
+        shared_dir = args.shared or SHARED_DIR
+    shared_tables = {}
+    persister = AsyncPersister() if args.shared is not None and not append and not args.no_persist else None
+
+    def persist(df, name):
+        # runs in the persister thread, its time is added to the table
+        with profile.table(name, None, request_filename(name, args.format)):
+            write_frame(df, name, args.format)
+
+    def output(data, name, replace=False):
+        # replace: the table is rebuilt from the earlier rows, it is not appended to
+        with profile.table(name, len(data), request_filename(name, args.format)):
+            if append and not replace:
+                df = append_request(data, name, args.format)
+            else:
+                df = data if isinstance(data, pd.DataFrame) else request_frame(data, name, args.format)
+                if persister is not None:
+                    persister.submit(persist, df, name)
+                elif not args.no_persist:
+                    write_frame(df, name, args.format)
+        if append and not replace:
+            if args.shared is None:
+                return
+            if df is None:
+                df = read_request(name, args.format)
+        if args.shared is not None:
+            # the pickles hold strings, the shared tables always have the typed columns
+            typed = convert_types(df.copy(), name) if args.format == 'pickle' else df
+            shared_tables[name] = publish_table(typed, name, shared_dir)
 
     # Write the list into pkl file
-    write_request(execute_rbg, 'Execute RBG')
-    write_request(start_handle_req, 'Start Handle Request')
-    write_request(end_handle_req, 'End Handle Request')
-    write_request(is_vb_ok, 'Is VB OK')
-    write_request(path_movement_finished, 'Path Movement Finished')
-    write_request(path_detail, 'Path Movement Finished - Detail')
-    write_request(path_movement_failed, 'Path Movement Failed')
-    write_request(unknown_content, 'Unknown Content')
-    write_request(alerts_received, 'Alerts Received')
-    write_request(alerts_processing, 'Alerts Processing')
-    write_request(alerts_handled, 'Alerts Handled')
-    write_request(telegrams_processed, 'Telegrams Processed')
-    write_request(telegrams_sent, 'Telegrams Sent')
-    write_request(sequence, 'Check Sequence')
-    write_request(position, 'Check Position')
-    write_request(nio, 'Get Set NIO')
+    with profile.stage('write'):
+        for name in OUTPUT_TABLES:
+            if name == 'Unknown Content' and not args.keep_unknown:
+                continue
+            output(results[name], name)
+        output(miner.rows(), TEMPLATE_TABLE, replace=True)
+
+    with profile.stage('alert_pipeline'):
+        # received -> processAlert -> sent telegrams -> handled per alert, and the alerts in flight per minute
+        alert_rows, tracker = track_alerts(results, args.alert_window * 1000, alert_state)
+        finished = tracker.finished
+        if alert_state and os.path.exists(request_filename(PIPELINE_TABLE, args.format)):
+            # the alerts that were open after the earlier run are resumed, the rows that its finish emitted
+            # for them are replaced and so are the minutes that are counted again
+            pipeline, positions = replace_rows(read_request(PIPELINE_TABLE, args.format),
+                                               request_frame(alert_rows, PIPELINE_TABLE, args.format),
+                                               alert_state['finished'])
+            finished = [positions[k] for k in finished]
+            output(pipeline, PIPELINE_TABLE, replace=True)
+            backlog = read_request(BACKLOG_TABLE, args.format)
+            minutes = tracker.backlog()
+            output(replace_rows(backlog, minutes, backlog.index[backlog['bucket'].isin(minutes['bucket'])],
+                                'bucket')[0], BACKLOG_TABLE, replace=True)
+        else:
+            output(alert_rows, PIPELINE_TABLE)
+            output(tracker.backlog(), BACKLOG_TABLE)
+        alert_state = dict(tracker.open_state, finished=finished)
+
+    with profile.stage('request_latency'):
+        # START/END HANDLE REQUEST pairs with their latency, percentiles per request type, area and hour
+        latency_rows, pairer = pair_requests(results['Start Handle Request'], results['End Handle Request'],
+                                             args.request_timeout * 1000)
+        output(latency_rows, LATENCY_TABLE)
+        if append:
+            # the percentiles cover the earlier runs too
+            pairer = RequestPairer.from_table(read_request(LATENCY_TABLE, args.format))
+        output(pairer.percentiles(), PERCENTILE_TABLE, replace=True)
+        if args.shared is not None:
+            save_catalog(shared_tables, shared_dir, format=args.format, files=len(files), incremental=append)
+            print(f"{len(shared_tables)} tables published to {shared_dir}")
+
+    with profile.stage('rollups'):
+        # Rows per minute, 15 minutes and hour by the main dimensions of every table, for dashboards
+        from rollups import build_rollups, write_rollups
+        write_rollups(build_rollups(results, {'Unknown Content': unknown_cells}), args.format, append)
+
+    if persister is not None:
+        # the LE index reads the written tables
+        with profile.stage('persist_wait'):
+            persister.shutdown()
+    # manifest and LE index describe the tables in result/
+    if not args.no_persist:
+        with profile.stage('manifest'):
+            for file_path in files:
+                processed[os.path.basename(file_path)] = file_signature(file_path)
+            save_manifest(processed, rbg_stage, args.format, alert_state)
+
+        with profile.stage('le_index'):
+            # le_index itself imports this module
+            from le_index import build_le_index
+            build_le_index(args.format)
 
     end_time = time.time()  # End timing here
-    print("Execution time:", end_time - start_time, "seconds")
\ No newline at end of file
+    print("Execution time:", end_time - start_time, "seconds")
+
+    if args.profile:
+        if profile.functions:
+            # the handlers were wrapped, add the logger functions without handler
+            profile.count_unhandled(miner.stage_lines, HANDLERS)
+        profile.stages['total'] = round(end_time - start_time, 3)
+        profile.save(files=len(files), format=args.format, workers=args.workers, incremental=append)
+        print("Profile written to", PROFILE_FILE)
@@ -0,0 +1,180 @@
+import os
+import json
+import time
+import argparse
+from collections import deque
+
+from extraction import OUTPUT_TABLES, timestamp_pattern, parse_entry
+
+# Tables that are printed as soon as an event arrives
+WATCHED_TABLES = ['Get Set NIO', 'Path Movement Failed', 'Alerts Handled']
+
+
+class CategoryBuffer(deque):
+    '''
+    Rolling buffer with the last parsed events of one output table.
+    If a path is given every event is also appended to that JSON lines file.
+    '''
+    def __init__(self, name, maxlen, path=None, echo=False):
+        super().__init__(maxlen=maxlen)
+        self.name = name
+        self.echo = echo
+        self.file = open(path, 'a', encoding='utf-8', buffering=1) if path else None
+
+    def append(self, parsed):
+        super().append(parsed)
+        if self.file:
+            self.file.write(json.dumps(parsed) + '\n')
+        if self.echo:
+            print(f"{self.name}: {parsed}")
+
+    def extend(self, rows):
+        for parsed in rows:
+            self.append(parsed)
+
+    def close(self):
+        if self.file:
+            self.file.close()
+
+
+def create_buffers(maxlen, output=None, watched=WATCHED_TABLES):
+    if output:
+        os.makedirs(output, exist_ok=True)
+    buffers = {}
+    for name in OUTPUT_TABLES:
+        path = os.path.join(output, name + '.jsonl') if output else None
+        buffers[name] = CategoryBuffer(name, maxlen, path, echo=name in watched)
+    return buffers
+
+
+def latest_log_file(folder):
+    # MFS-YYYYMMDD-HH-1.log, the name order is the time order
+    files = sorted(f for f in os.listdir(folder) if f.startswith('MFS-') and f.endswith('.log'))
+    if not files:
+        return None
+    return os.path.join(folder, files[-1])
+
+
+class LogFollower:
+    '''
+    Tails the active plain text MFS log and parses every entry with the extraction parsers.
+    Lines without a timestamp header are continuation lines of the previous entry (as in combined_logs.py),
+    so an entry is parsed when the next header arrives or after flush_after seconds without new data.
+    The file is read in binary and the byte offset is tracked, a file that got shorter than that was truncated.
+    When a newer hourly file shows up the rest of the current file is read from the open handle (the old file may
+    be renamed, compressed or removed by then) and the follower switches over.
+    '''
+    def __init__(self, folder, results, from_start=False, poll_interval=0.2, flush_after=0.5):
+        self.folder = folder
+        self.results = results
+        self.state = {'rbg_stage': None}
+        self.poll_interval = poll_interval
+        self.flush_after = flush_after
+        self.path = None
+        self.file = None
+        self.offset = 0
+        self.partial = b''
+        self.entry_match = None
+        self.entry_lines = []
+        self.from_start = from_start
+        self.last_data = time.time()
+
+    def open(self, path, from_start):
+        if self.file:
+            self.file.close()
+        self.path = path
+        self.file = open(path, 'rb')
+        self.offset = 0 if from_start else self.file.seek(0, os.SEEK_END)
+        self.partial = b''
+        print(f"Following {path}")
+
+    def flush_entry(self):
+        if self.entry_match:
+            content = self.entry_match.group(6)
+            if self.entry_lines:
+                content = (content + '\n' + ''.join(self.entry_lines)).rstrip('\n')
+            parse_entry(*self.entry_match.groups()[:5], content, self.results, self.state)
+        self.entry_match = None
+        self.entry_lines = []
+
+    def handle_line(self, data):
+        line = data.decode('utf-8', errors='ignore').replace('\r\n', '\n')
+        match = timestamp_pattern.match(line)
+        if match:
+            self.flush_entry()
+            self.entry_match = match
+        elif self.entry_match:
+            self.entry_lines.append(line)
+
+    def poll(self):
+        '''
+        Reads everything that was written since the last call, returns the number of lines read.
+        '''
+        if os.fstat(self.file.fileno()).st_size < self.offset:
+            # truncated, start again from the beginning
+            self.flush_entry()
+            self.open(self.path, from_start=True)
+
+        count = 0
+        for data in iter(self.file.readline, b''):
+            self.offset += len(data)
+            if not data.endswith(b'\n'):
+                # the writer is in the middle of this line
+                self.partial += data
+                break
+            self.handle_line(self.partial + data)
+            self.partial = b''
+            count += 1
+        return count
+
+    def step(self):
+        '''
+        One round of run: opens the latest file, reads the new lines and switches to a newer hourly file.
+        Returns False if there was nothing to do, then run waits poll_interval.
+        '''
+        if self.path is None:
+            path = latest_log_file(self.folder)
+            if path is None:
+                return False
+            self.open(path, self.from_start)
+
+        if self.poll():
+            self.last_data = time.time()
+            return True
+
+        if self.entry_match and time.time() - self.last_data > self.flush_after:
+            self.flush_entry()
+
+        latest = latest_log_file(self.folder)
+        if latest and latest > self.path:
+            # rotated: the old file is complete, drain the old handle and continue with the new file
+            self.poll()
+            if self.partial:
+                self.handle_line(self.partial)
+            self.flush_entry()
+            self.open(latest, from_start=True)
+            return True
+        return False
+
+    def run(self):
+        while True:
+            if not self.step():
+                time.sleep(self.poll_interval)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Parse the active MFS log while it is written')
+    parser.add_argument('folder', help='folder with the active MFS-*.log file')
+    parser.add_argument('--output', default=None, help='append the parsed events to <output>/<table>.jsonl')
+    parser.add_argument('--buffer', type=int, default=10000, help='events kept in memory per table')
+    parser.add_argument('--from-start', action='store_true', help='parse the active file from the beginning')
+    args = parser.parse_args()
+
+    buffers = create_buffers(args.buffer, args.output)
+    try:
+        LogFollower(args.folder, buffers, from_start=args.from_start).run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for buffer in buffers.values():
+            buffer.close()
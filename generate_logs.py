@@ -0,0 +1,213 @@
+import os
+import gzip
+import random
+import argparse
+from datetime import datetime, timedelta
+
+# Share of the log entries per logger function, counted on MFS-20250207-10-1.log.gz
+ENTRY_WEIGHTS = {
+    'executeRbg': 57354,
+    'handleRequest': 17180,
+    'getPathForMovement': 12730,
+    'isVBOK': 7439,
+    'updatePlanned': 6110,
+    'alert': 5131,
+    'send': 4077,
+    'info': 2583,
+    'setStatusAnyWarte': 2041,
+    'updateFilled': 1857,
+    'sendAVImpl': 1542,
+    'isPositionOK': 1151,
+    'checkCPU': 900,
+    'checkSequence': 623,
+    'mfsEinlagern': 354,
+    'getAndSetNioDestination': 20,
+}
+
+# Logger names as they appear in the header, the extraction only uses the part after the last dot
+LOGGERS = {
+    'executeRbg': 'lis.mfs.business.rbg.RbgStrategyService.executeRbg',
+    'handleRequest': 'is.mfs.business.seq2.SequencePlanner.handleRequest',
+    'getPathForMovement': 'getPathForMovement',
+    'isVBOK': 'hl.hilis.mfs.business.seq2.SequencingStatus.isVBOK',
+    'updatePlanned': 'hl.hilis.mfs.business.seq2.VBPlanner.updatePlanned',
+    'mainLoop': 'mainLoop',
+    'processAlert': 'processAlert',
+    'fmRbgTelDisp': 'hl.hilis.mfs.business.MfsFmRbgService.fmRbgTelDisp',
+    'alertHandler()': 'alertHandler()',
+    'send': 'send',
+    'info': 'com.hl.hilis.mfs.business.seq2.VBPlanner.info',
+    'setStatusAnyWarte': 'ilis.mfs.business.mfs.MfsService.setStatusAnyWarte',
+    'updateFilled': '.hl.hilis.mfs.business.seq2.VBPlanner.updateFilled',
+    'sendAVImpl': 'business.telegram.TelegramSenderService.sendAVImpl',
+    'isPositionOK': 'is.mfs.business.seq2.SequencingStatus.isPositionOK',
+    'checkCPU': 'm.hl.hilis.mfs.business.MonitoringService.checkCPU',
+    'checkSequence': 'hl.hilis.mfs.business.mfs.MfsService.checkSequence',
+    'mfsEinlagern': 'lis.mfs.business.MfsAvService.mfsEinlagern[laenge]',
+    'getAndSetNioDestination': 'ness.mfs.MfsProjectService.getAndSetNioDestination',
+}
+
+ROUTE_POINTS = [101001, 101002, 101100, 1110, 1118, 1410, 1418, 1715, 1716, 1725, 1726, 1746, 1772, 1057, 1003, 1002]
+ALERT_TEXT = '1720\\7176\\ZZ\\0\\1720\\1629\\1725\\0\\2048\\0\\0\\0\\0\\0\\xxxxxxxxxxxxxxxxxxxx\\0\\10003789            \\0\\0\\0\\0\\0\\0\\0\\'
+
+
+class LogGenerator:
+    '''
+    Writes synthetic MFS-YYYYMMDD-HH-1.log.gz files with the line formats and the function mix of the real logs,
+    including entries with continuation lines (planner situations, CPU monitoring).
+    Sample usage:
+    LogGenerator(seed=1).write_hours('synthetic', datetime(2025, 2, 6), hours=24)
+    '''
+    def __init__(self, seed=0, lines_per_hour=150000):
+        self.random = random.Random(seed)
+        self.lines_per_hour = lines_per_hour
+        self.operation_num = 41850000
+        self.le = 1847000
+        self.task_id = 0
+        self.routes = [self.make_route() for _ in range(200)]
+        self.kinds = list(ENTRY_WEIGHTS)
+        self.weights = list(ENTRY_WEIGHTS.values())
+
+    def make_route(self):
+        points = self.random.sample(ROUTE_POINTS, self.random.randint(2, 6))
+        return ', '.join(f"[ {start} -> {end} ]" for start, end in zip(points, points[1:]))
+
+    def next_le(self):
+        # mostly recent LEs, so the same box shows up in several tables
+        self.le += self.random.random() < 0.05
+        return self.le - self.random.randint(0, 40)
+
+    def header(self, timestamp, kind, info_code='I', thread=None):
+        thread = thread or self.random.choice(['MF1', 'MF2', 'MF3'])
+        return f"[{timestamp} {info_code} {thread} G{self.operation_num} {LOGGERS[kind]}]"
+
+    def entry(self, timestamp, kind):
+        '''
+        Returns the lines of one log entry of the given kind.
+        '''
+        r = self.random
+        self.operation_num += r.randint(1, 9)
+        le = self.next_le()
+
+        if kind == 'executeRbg':
+            roll = r.random()
+            if roll < 0.05:
+                return [self.header(timestamp, kind) + f" RBG {r.randint(1, 4)} EVALUATED: "]
+            self.task_id += 1
+            prefix = 'try execute Task: ' if roll < 0.3 else ''
+            locked = 'true' if roll > 0.8 else 'false'
+            task = f"TASK_ID: {self.task_id}, "
+            if r.random() < 0.2:
+                subtasks = ', '.join(f"SingleTask - LAM(s)={{1}} LE: {le + k}" for k in range(r.randint(2, 3)))
+                task += f"TASK_TYPE: LamTask CATEGORY: ON_TIME LOCKED: {locked} POINTS: {r.randint(800, 1500)} TELEGRAM_TYPE: FS LAM: 1 INFO: LamTask - LAM(s)={{1}} SUBTASKS=[, {subtasks}]"
+            else:
+                task += f"TASK_TYPE: SingleTask CATEGORY: ON_TIME LOCKED: {locked} POINTS: {r.randint(800, 1500)} TELEGRAM_TYPE: FS LAM: 1 INFO: SingleTask - LAM(s)={{1}} LE: {le}"
+            if locked == 'true':
+                task += ' -- FAILURE: another LHM is in front of this task-LHM in compartment'
+            return [self.header(timestamp, kind) + ' ' + prefix + task]
+
+        if kind == 'handleRequest':
+            params = f"[MF{r.randint(1, 2)}, {le}" + (', true]' if r.random() < 0.5 else ']')
+            if r.random() < 0.5:
+                return [self.header(timestamp, kind) + f" START HANDLE REQUEST: CHECK_SEQ params: {params}"]
+            return [self.header(timestamp, kind) + f" END HANDLE REQUEST: CHECK_SEQ params: {params} result: {r.randint(0, 1)} response time: {r.randint(0, 20)}ms"]
+
+        if kind == 'getPathForMovement':
+            roll = r.random()
+            if roll < 0.9:
+                return [self.header(timestamp, kind) + f" path search finished -- mfsId: {le}; [true, [[{r.choice(self.routes)}]], 0]"]
+            if roll < 0.97:
+                return [self.header(timestamp, kind) + f" path search finished -- mfsId: {le}; [false, [], -2]"]
+            start, end = r.sample(ROUTE_POINTS, 2)
+            return [self.header(timestamp, kind, 'W') + f" path search failed -- mfsTrans: [ mfs=1, mfs-id={le}, {start} -> {end}, checkLocal=63, checkRemote=8, distType=0, saveWay=true, minDist=0 ] failcode: -2"]
+
+        if kind == 'isVBOK':
+            info = r.choice(['', f"#reserved={r.randint(0, 5)}, #VBOK={r.randint(0, 5)}", "isMoving=true, status=2, requiredStatusBit=4"])
+            return [self.header(timestamp, kind) + f" id={le}: VB not OK; result=false; info: {info}"]
+
+        if kind == 'alert':
+            # received, processed, dispatched and handled in the same millisecond
+            name = r.choice(['MF1_FROMTSS', 'MF2_FROMTSS', 'MF1_FROMSPS'])
+            return [
+                self.header(timestamp, 'mainLoop', thread='Alert-Thread') + f" Alert empfangen: Name={name} Text={ALERT_TEXT}",
+                self.header(timestamp, 'processAlert') + f" Start Alert-Verarbeitung: Alert={name},Lfdnr={self.operation_num},Text={ALERT_TEXT}",
+                self.header(timestamp, 'fmRbgTelDisp') + f" TelegramDispatch processed - success: true, alert: {name}, text: {ALERT_TEXT}, telStructure: FM-AUFTRAG",
+                self.header(timestamp, 'alertHandler()') + f" Alert {name} wurde verarbeitet. Text: '{ALERT_TEXT}' time: {r.randint(0, 30)}[ms]",
+            ]
+
+        if kind == 'send':
+            return [self.header(timestamp, kind) + f" Alert LHM_FACHTIEFE_1 wurde gesendet. Text: '\\MFS_ID1={le}\\HOST_LHM_ID1=10027159\\LAGER1=1\\S1=5\\'"]
+
+        if kind == 'isPositionOK':
+            if r.random() < 0.5:
+                return [self.header(timestamp, kind) + f" LE id={le}: position=1212 is not a valid_position in t$sequenz_platz_def. return false"]
+            return [self.header(timestamp, kind, 'W') + f" CHECK_POSITION: LE id={le} on position=1218, seq=1726.9526838.0.0[9526838]{{3}} is not constrained"]
+
+        if kind == 'checkSequence':
+            return [self.header(timestamp, kind, 'W') + f" sequence check failed. id={le} is constrained. returned=1"]
+
+        if kind == 'getAndSetNioDestination':
+            return [self.header(timestamp, kind) + f" id={le}: send to NIO=1746 (AUSSCHLEUSEN)"]
+
+        if kind == 'updatePlanned':
+            return [self.header(timestamp, kind, 'W') + " planning on lg=VBG02: STOPPED, seq=1726.9526838.0.0[9526838]{3} was not completely planned",
+                    f"[VB01, [{le}/400]~, [{le + 1}/400]~, []~, , , , ]"]
+
+        if kind == 'updateFilled':
+            return [self.header(timestamp, kind) + " laneGroup VBG01 filled:"] + [
+                f"[VB0{k}, [{le + k}/400]~, [{le + k + 1}/400]~, []~, []~, , , , ]" for k in range(1, r.randint(2, 5))]
+
+        if kind == 'info':
+            return [self.header(timestamp, kind) + " SITUATION:",
+                    "LANEGROUPS:\t[VBG01, VBG02, VBG03, VBG04]",
+                    f"MOVING:[{', '.join(str(le + k) for k in range(8))}]",
+                    f"STATES:{{{', '.join(f'{le + k}=6' for k in range(8))}}}"]
+
+        if kind == 'checkCPU':
+            return [self.header(timestamp, kind) + " Thread-ID: 34     \t Name: MF3            \t CPUtime: 2,26%"] + [
+                f"Thread-ID: {k}     \t Name: MF{k - 31}            \t CPUtime: {r.randint(1, 9)},{r.randint(10, 99)}%" for k in (33, 32)]
+
+        if kind == 'mfsEinlagern':
+            return [self.header(timestamp, kind, 'W') + " LogAv value is null!"]
+
+        if kind == 'sendAVImpl':
+            return [self.header(timestamp, kind) + f" telegram sended: LHM_FACHTIEFE_1; text: \\MFS_ID1={le}\\HOST_LHM_ID1=10027159\\LAGER1=1\\"]
+
+        return [self.header(timestamp, kind) + " next position = 0"]
+
+    def hour_lines(self, hour):
+        '''
+        Yields the lines of one hour, about lines_per_hour lines in timestamp order.
+        '''
+        # about 1.25 lines per entry with the alerts and continuation lines
+        entries = int(self.lines_per_hour / 1.25)
+        offsets = sorted(self.random.random() * 3600 for _ in range(entries))
+        for offset, kind in zip(offsets, self.random.choices(self.kinds, self.weights, k=entries)):
+            timestamp = (hour + timedelta(seconds=offset)).strftime('%Y.%m.%d %H:%M:%S.%f')[:-3]
+            yield from self.entry(timestamp, kind)
+
+    def write_hours(self, folder, start, hours):
+        os.makedirs(folder, exist_ok=True)
+        paths = []
+        for k in range(hours):
+            hour = start + timedelta(hours=k)
+            path = os.path.join(folder, hour.strftime('MFS-%Y%m%d-%H-1.log.gz'))
+            with gzip.open(path, 'wt', encoding='utf-8', compresslevel=6) as f:
+                for line in self.hour_lines(hour):
+                    f.write(line + '\n')
+            paths.append(path)
+        return paths
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write synthetic hourly MFS-*.log.gz files')
+    parser.add_argument('folder', help='output folder')
+    parser.add_argument('--hours', type=int, default=1, help='number of hourly files, 744 for a month')
+    parser.add_argument('--lines-per-hour', type=int, default=150000)
+    parser.add_argument('--start', default='2025-02-06 00', help='first hour, YYYY-MM-DD HH')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    generator = LogGenerator(args.seed, args.lines_per_hour)
+    paths = generator.write_hours(args.folder, datetime.strptime(args.start, '%Y-%m-%d %H'), args.hours)
+    print(f"Wrote {len(paths)} files to {args.folder}")
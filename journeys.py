@@ -0,0 +1,231 @@
+import os
+import heapq
+import argparse
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from extraction import PARQUET_ROW_GROUP_SIZE, request_filename, read_request, write_frame
+from le_index import LE_COLUMNS, to_milliseconds
+
+JOURNEY_TABLE = 'LE Journeys'
+
+# Output table -> event name in the journey counts, as in combined_le_df of the notebook
+JOURNEY_EVENTS = {
+    'Start Handle Request': 'start_handle_request',
+    'End Handle Request': 'end_handle_request',
+    'Execute RBG': 'execute_rbg',
+    'Path Movement Finished': 'path_movement_finished',
+    'Path Movement Failed': 'path_movement_failed',
+    'Check Position': 'is_position_ok',
+    'Check Sequence': 'check_sequence',
+    'Is VB OK': 'is_vb_ok',
+    'Get Set NIO': 'get_set_nio',
+}
+EVENT_NAMES = list(JOURNEY_EVENTS.values())
+PATH_FINISHED = EVENT_NAMES.index('path_movement_finished')
+PATH_FAILED = EVENT_NAMES.index('path_movement_failed')
+NIO = EVENT_NAMES.index('get_set_nio')
+
+# Columns read per table besides timestamp and the LE column, the value of the event
+VALUE_COLUMNS = {
+    'Path Movement Finished': ['route', 'status'],
+    'Get Set NIO': ['send_to'],
+}
+
+
+class LeJourney:
+    __slots__ = ('le', 'first_seen', 'last_seen', 'counts', 'destination', 'nio_destination',
+                 'failed_searches', 'loops', 'destinations')
+
+    def __init__(self, le, timestamp):
+        self.le = le
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.counts = [0] * len(EVENT_NAMES)
+        self.destination = None
+        self.nio_destination = None
+        self.failed_searches = 0
+        self.loops = 0
+        self.destinations = None
+
+    def row(self):
+        row = {'le': self.le, 'first_seen': self.first_seen, 'last_seen': self.last_seen,
+               'events': sum(self.counts)}
+        row.update(zip(EVENT_NAMES, self.counts))
+        row['final_destination'] = self.destination
+        row['nio'] = self.nio_destination is not None
+        row['nio_destination'] = self.nio_destination
+        row['failed_path_searches'] = self.failed_searches
+        row['loops'] = self.loops
+        return row
+
+
+class JourneyBuilder:
+    '''
+    Builds one row per LE journey from events that arrive in timestamp order.
+    A journey ends when the LE had no event for idle_timeout_ms, then its row is emitted and its state dropped,
+    so memory depends on the LEs active within the timeout and not on the number of events.
+    The active journeys are kept least recently seen first, so expiring only looks at the front.
+    final_destination is the end of the last found route, loops counts searches to a destination
+    that was already searched before in the journey with another destination in between.
+    '''
+    def __init__(self, idle_timeout_ms=3600 * 1000, emit=None):
+        self.idle_timeout_ms = idle_timeout_ms
+        self.active = OrderedDict()
+        self.rows = []
+        self.emit = emit or self.rows.append
+
+    def add(self, timestamp, event, le, value=None):
+        self.expire(timestamp)
+        journey = self.active.get(le)
+        if journey is None:
+            journey = self.active[le] = LeJourney(le, timestamp)
+        else:
+            self.active.move_to_end(le)
+        journey.last_seen = timestamp
+        journey.counts[event] += 1
+
+        if event == PATH_FINISHED:
+            destination, found = value
+            if not found:
+                journey.failed_searches += 1
+            elif destination is not None and destination != journey.destination:
+                if journey.destinations is None:
+                    journey.destinations = set()
+                if destination in journey.destinations:
+                    journey.loops += 1
+                journey.destinations.add(destination)
+                journey.destination = destination
+        elif event == PATH_FAILED:
+            journey.failed_searches += 1
+        elif event == NIO:
+            journey.nio_destination = value
+
+    def expire(self, now):
+        while self.active:
+            le, journey = next(iter(self.active.items()))
+            if now - journey.last_seen <= self.idle_timeout_ms:
+                break
+            del self.active[le]
+            self.emit(journey.row())
+
+    def finish(self):
+        for journey in self.active.values():
+            self.emit(journey.row())
+        self.active.clear()
+
+
+def route_destinations(routes):
+    # last point of every route, -1 for the empty route of failed searches
+    offsets = routes['offsets']
+    lengths = np.diff(offsets)
+    return np.where(lengths > 0, routes['hop_to'][np.maximum(offsets[1:] - 1, 0)], -1)
+
+
+def le_rows(df, name):
+    '''
+    Returns the timestamps in ms, the LEs and the row positions of the events in one output table,
+    rows of LamTasks are repeated for each of their LEs and rows without a numeric LE are left out.
+    '''
+    ts = to_milliseconds(df['timestamp'])
+    le = df[LE_COLUMNS[name]].astype(str)
+    rows = np.arange(len(df))
+    if name == 'Execute RBG':
+        # LamTasks have several LEs
+        le = le.str.split(', ')
+        counts = le.str.len().to_numpy()
+        ts, rows = np.repeat(ts, counts), np.repeat(rows, counts)
+        le = le.explode()
+    le = pd.to_numeric(le, errors='coerce').to_numpy()
+    valid = ~np.isnan(le)
+    return ts[valid], le[valid].astype(np.int64), rows[valid]
+
+
+def frame_events(df, name, destinations=None):
+    '''
+    Yields (timestamp in ms, event, le, value) for the rows of one output table.
+    '''
+    event = EVENT_NAMES.index(JOURNEY_EVENTS[name])
+    ts, le, rows = le_rows(df, name)
+    ts, le = ts.tolist(), le.tolist()
+
+    if name == 'Path Movement Finished':
+        destination = destinations[df['route'].to_numpy(dtype=np.int64)] if destinations is not None else np.full(len(df), -1)
+        found = df['status'].astype(str).isin(['true', 'True']).to_numpy()
+        values = [(int(d) if d >= 0 else None, f) for d, f in zip(destination[rows], found[rows])]
+    elif name in VALUE_COLUMNS:
+        values = df[VALUE_COLUMNS[name][0]].astype(str).to_numpy()[rows].tolist()
+    else:
+        values = [None] * len(ts)
+    return zip(ts, [event] * len(ts), le, values)
+
+
+def table_frames(name, columns, output_format='pickle'):
+    '''
+    Yields the columns of one output table as DataFrames of at most a parquet row group, so the events are only
+    built for one chunk at a time. Parquet files are read one row group at a time and feather files are memory
+    mapped, pickles have to be loaded as a whole.
+    '''
+    if output_format == 'parquet':
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(request_filename(name, output_format)).iter_batches(columns=columns):
+            yield batch.to_pandas()
+    elif output_format == 'feather':
+        import pyarrow.feather as feather
+        table = feather.read_table(request_filename(name, output_format), columns=columns, memory_map=True)
+        for batch in table.to_batches(max_chunksize=PARQUET_ROW_GROUP_SIZE):
+            yield batch.to_pandas()
+    else:
+        df = read_request(name, output_format)[columns]
+        for start in range(0, len(df), PARQUET_ROW_GROUP_SIZE):
+            yield df.iloc[start:start + PARQUET_ROW_GROUP_SIZE]
+
+
+def table_events(name, output_format='pickle', destinations=None):
+    '''
+    Streams the events of one output table.
+    '''
+    columns = ['timestamp', LE_COLUMNS[name]] + VALUE_COLUMNS.get(name, [])
+    for df in table_frames(name, columns, output_format):
+        yield from frame_events(df, name, destinations)
+
+
+def build_journeys(output_format='pickle', idle_timeout_s=3600):
+    '''
+    Merges the event streams of the output tables in timestamp order and returns the journey table.
+    Sample usage:
+    journeys = build_journeys()
+    journeys[journeys['nio']]
+    '''
+    destinations = None
+    if os.path.exists('result/path_routes.npz'):
+        from path_routes import load_routes
+        destinations = route_destinations(load_routes())
+
+    streams = [table_events(name, output_format, destinations) for name in JOURNEY_EVENTS
+               if os.path.exists(request_filename(name, output_format))]
+    builder = JourneyBuilder(idle_timeout_s * 1000)
+    for timestamp, event, le, value in heapq.merge(*streams, key=lambda e: e[0]):
+        builder.add(timestamp, event, le, value)
+    builder.finish()
+
+    df = pd.DataFrame(builder.rows, columns=list(LeJourney(0, 0).row()))
+    df['first_seen'] = pd.to_datetime(df['first_seen'], unit='ms')
+    df['last_seen'] = pd.to_datetime(df['last_seen'], unit='ms')
+    df['duration_sec'] = (df['last_seen'] - df['first_seen']).dt.total_seconds()
+    df['final_destination'] = df['final_destination'].astype('Int64')
+    return df.sort_values(['first_seen', 'le'], kind='stable', ignore_index=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build one row per LE journey from the extracted tables')
+    parser.add_argument('--format', default='pickle', choices=['pickle', 'parquet', 'feather'])
+    parser.add_argument('--idle-timeout', type=int, default=3600,
+                        help='seconds without an event after which the journey of an LE ends')
+    args = parser.parse_args()
+
+    journeys = build_journeys(args.format, args.idle_timeout)
+    write_frame(journeys, JOURNEY_TABLE, args.format)
+    print(f"{len(journeys)} journeys of {journeys['le'].nunique()} LEs written to {request_filename(JOURNEY_TABLE, args.format)}")
@@ -0,0 +1,144 @@
+import os
+import numpy as np
+import pandas as pd
+
+from extraction import TIMESTAMP_FORMAT, read_request, request_filename
+
+INDEX_FILE = 'result/le_index.npz'
+
+# Output table -> column with the LE (mfs_id) of the row
+LE_COLUMNS = {
+    'Execute RBG': 'le',
+    'Start Handle Request': 'mfs_id',
+    'End Handle Request': 'mfs_id',
+    'Is VB OK': 'id',
+    'Path Movement Finished': 'mfs_id',
+    'Path Movement Failed': 'mfs_id',
+    'Check Sequence': 'id',
+    'Check Position': 'id',
+    'Get Set NIO': 'id',
+}
+
+# (table, format) -> modification time and DataFrame of the loaded output tables, so repeated traces do not
+# read the files again, a table written by a later extraction is read again
+loaded_tables = {}
+
+
+def to_milliseconds(timestamps):
+    if not pd.api.types.is_datetime64_any_dtype(timestamps):
+        timestamps = pd.to_datetime(timestamps, format=TIMESTAMP_FORMAT)
+    return timestamps.astype('datetime64[ms]').astype('int64').to_numpy()
+
+
+def build_le_index(output_format='pickle'):
+    '''
+    Builds the inverted index LE id -> rows and operation_num (G...) -> rows over the output tables
+    and saves it to result/le_index.npz.
+    The comma separated le of LamTasks in Execute RBG gets one entry per LE.
+    Both indexes are sorted by key and timestamp, so a lookup is a binary search.
+    '''
+    tables = [name for name in LE_COLUMNS if os.path.exists(request_filename(name, output_format))]
+    le_parts = []
+    group_parts = []
+
+    for table_code, name in enumerate(tables):
+        df = read_request(name, output_format)
+        if len(df) == 0:
+            continue
+        ts = to_milliseconds(df['timestamp'])
+        rows = np.arange(len(df), dtype=np.int64)
+
+        le = df[LE_COLUMNS[name]].astype(str)
+        if name == 'Execute RBG':
+            le = le.str.split(', ')
+            counts = le.str.len().to_numpy()
+            le = le.explode()
+            ts_le, rows_le = np.repeat(ts, counts), np.repeat(rows, counts)
+        else:
+            ts_le, rows_le = ts, rows
+        le = pd.to_numeric(le, errors='coerce').to_numpy()
+        valid = ~np.isnan(le)
+        le_parts.append((le[valid].astype(np.int64), np.full(valid.sum(), table_code, dtype=np.int8),
+                         rows_le[valid], ts_le[valid]))
+
+        group = pd.to_numeric(df['operation_num'].astype(str).str[1:], errors='coerce').to_numpy()
+        valid = ~np.isnan(group)
+        group_parts.append((group[valid].astype(np.int64), np.full(valid.sum(), table_code, dtype=np.int8),
+                            rows[valid], ts[valid]))
+
+    index = {'tables': np.array(tables)}
+    for prefix, parts in [('le', le_parts), ('group', group_parts)]:
+        keys, codes, rows, ts = [np.concatenate([part[i] for part in parts]) if parts else np.array([], dtype=np.int64)
+                                 for i in range(4)]
+        order = np.lexsort((ts, keys))
+        index[prefix + '_keys'] = keys[order]
+        index[prefix + '_tables'] = codes[order]
+        index[prefix + '_rows'] = rows[order]
+        index[prefix + '_ts'] = ts[order]
+
+    np.savez_compressed(INDEX_FILE, **index)
+    return index
+
+
+def load_le_index():
+    with np.load(INDEX_FILE) as index:
+        return {key: index[key] for key in index.files}
+
+
+def load_table(name, output_format):
+    mtime = os.path.getmtime(request_filename(name, output_format))
+    loaded = loaded_tables.get((name, output_format))
+    if loaded is None or loaded[0] != mtime:
+        loaded = loaded_tables[(name, output_format)] = (mtime, read_request(name, output_format))
+    return loaded[1]
+
+
+def lookup(index, prefix, key, output_format=None):
+    '''
+    Returns the rows of all output tables for one key as a timeline ordered by time,
+    with the table name in 'event' and the time in milliseconds in 'ts_ms'.
+    output_format None is the format of the last extraction, see ResultDataset.detect_format.
+    '''
+    if output_format is None:
+        # dataset imports more than the index needs
+        from dataset import ResultDataset
+        output_format = ResultDataset.detect_format()
+    keys = index[prefix + '_keys']
+    start, end = np.searchsorted(keys, key, side='left'), np.searchsorted(keys, key, side='right')
+    codes = index[prefix + '_tables'][start:end]
+    rows = index[prefix + '_rows'][start:end]
+    ts = index[prefix + '_ts'][start:end]
+
+    frames = []
+    for table_code in np.unique(codes):
+        name = str(index['tables'][table_code])
+        selected = codes == table_code
+        frame = load_table(name, output_format).iloc[rows[selected]].reset_index(drop=True)
+        frame.insert(0, 'event', name)
+        frame.insert(0, 'ts_ms', ts[selected])
+        frames.append(frame)
+
+    if not frames:
+        return pd.DataFrame(columns=['ts_ms', 'event'])
+    return pd.concat(frames, ignore_index=True).sort_values('ts_ms', kind='stable', ignore_index=True)
+
+
+def trace_le(le_id, index=None, output_format=None):
+    '''
+    Sample usage:
+    index = load_le_index()
+    trace_le(1849286, index)
+    '''
+    if index is None:
+        index = load_le_index()
+    return lookup(index, 'le', int(le_id), output_format)
+
+
+def trace_group(operation_num, index=None, output_format=None):
+    '''
+    Sample usage:
+    trace_group('G41852041', index)
+    '''
+    if index is None:
+        index = load_le_index()
+    return lookup(index, 'group', int(str(operation_num).lstrip('G')), output_format)
@@ -0,0 +1,109 @@
+import io
+import os
+import gzip
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    # python-isal inflates a few times faster than zlib, the files are the same
+    from isal import igzip as gzip_backend
+except ImportError:
+    gzip_backend = gzip
+
+# Threads that inflate the next files while the current one is parsed, zlib releases the GIL while it inflates
+READ_THREADS = min(4, (os.cpu_count() or 1) - 1)
+# Characters decoded per step when the lines are split, 128 times the TextIOWrapper default
+DECODE_CHUNK_SIZE = 1 << 20
+
+
+def inflate(file_path):
+    '''
+    The whole uncompressed content of a log file as bytes, all gzip members of .gz files.
+    '''
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    return gzip_backend.decompress(data) if file_path.endswith('.gz') else data
+
+
+def split_lines(data):
+    '''
+    The lines of the content like gzip.open(..., 'rt', encoding='utf-8', errors='ignore') yields them,
+    with CR LF and CR line ends turned into LF. Decodes and splits the buffer in large chunks
+    instead of the 8 KB default.
+    '''
+    text = io.TextIOWrapper(io.BytesIO(data), encoding='utf-8', errors='ignore')
+    text._CHUNK_SIZE = DECODE_CHUNK_SIZE
+    return text.readlines()
+
+
+def to_text(data):
+    '''
+    The content as one string with LF line ends, for regex searches over the whole file.
+    '''
+    text = data.decode('utf-8', errors='ignore')
+    return text.replace('\r\n', '\n').replace('\r', '\n') if '\r' in text else text
+
+
+def read_lines(file_path):
+    return split_lines(inflate(file_path))
+
+
+def read_text(file_path):
+    return to_text(inflate(file_path))
+
+
+class LogReader:
+    '''
+    Reads the files in the given order and inflates up to threads files ahead in background threads,
+    so inflating overlaps with the parsing of the current file. Decoding and splitting the lines stays in the
+    calling thread, at most threads + 1 uncompressed files are held. With threads=0 every file is read on demand.
+    Sample usage:
+    reader = LogReader(files)
+    for file_path in files:
+        lines = reader.lines(file_path)
+    '''
+    def __init__(self, files, threads=READ_THREADS):
+        self.files = list(files)
+        self.positions = {file_path: position for position, file_path in enumerate(self.files)}
+        self.threads = threads
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='inflate') if threads > 0 else None
+        self.futures = {}
+        self.next_file = 0
+
+    def schedule(self, file_path):
+        # files are prefetched in the order given, up to threads files after the one that is read
+        position = self.positions.get(file_path, -1)
+        self.next_file = max(self.next_file, position + 1)
+        while self.next_file < len(self.files) and self.next_file <= position + self.threads:
+            upcoming = self.files[self.next_file]
+            self.futures[upcoming] = self.executor.submit(inflate, upcoming)
+            self.next_file += 1
+
+    def data(self, file_path):
+        if self.executor is None:
+            return inflate(file_path)
+        future = self.futures.pop(file_path, None)
+        self.schedule(file_path)
+        return future.result() if future is not None else inflate(file_path)
+
+    def lines(self, file_path):
+        return split_lines(self.data(file_path))
+
+    def text(self, file_path):
+        return to_text(self.data(file_path))
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+        self.futures.clear()
+
+
+def read_log_files(files, threads=READ_THREADS):
+    '''
+    Yields (file path, lines) for the files in order, see LogReader.
+    '''
+    reader = LogReader(files, threads)
+    try:
+        for file_path in reader.files:
+            yield file_path, reader.lines(file_path)
+    finally:
+        reader.close()
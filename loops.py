@@ -0,0 +1,199 @@
+import os
+import heapq
+import argparse
+from collections import OrderedDict, deque
+
+import numpy as np
+import pandas as pd
+
+from extraction import request_filename, write_frame
+from journeys import le_rows, table_frames
+from le_index import LE_COLUMNS
+
+LOOP_TABLE = 'LE Loops'
+
+# Output table -> logger function and the columns that make the signature of an event: stage and result code
+SIGNATURES = {
+    'Start Handle Request': ('handleRequest START', ['request']),
+    'End Handle Request': ('handleRequest END', ['request', 'result']),
+    'Execute RBG': ('executeRbg', ['fail_status']),
+    'Path Movement Finished': ('getPathForMovement', ['status', 'code']),
+    'Path Movement Failed': ('getPathForMovement failed', ['failcode']),
+    'Check Position': ('isPositionOK', []),
+    'Check Sequence': ('checkSequence', ['sequence_status', 'returned']),
+    'Is VB OK': ('isVBOK', ['vb_status', 'result']),
+    'Get Set NIO': ('getAndSetNioDestination', ['send_to']),
+}
+large_id_pattern = r'\d{5,}'
+
+
+class LeLoopState:
+    __slots__ = ('le', 'last_seen', 'signatures', 'timestamps', 'matches', 'period', 'start', 'end',
+                 'repetitions', 'events', 'cycle')
+
+    def __init__(self, le, window, max_period):
+        self.le = le
+        self.last_seen = None
+        self.signatures = deque(maxlen=window)
+        self.timestamps = deque(maxlen=window)
+        # matches[p] = number of latest events equal to the event p positions before them
+        self.matches = [0] * (max_period + 1)
+        self.period = 0
+        self.start = self.end = None
+        self.repetitions = self.events = 0
+        self.cycle = None
+
+    def row(self, names):
+        return {'le': self.le, 'start': self.start, 'end': self.end, 'period': self.period,
+                'repetitions': self.repetitions, 'events': self.events,
+                'cycle': ' > '.join(names[signature] for signature in self.cycle)}
+
+
+class LoopDetector:
+    '''
+    Finds LEs that repeat the same cycle of events (e.g. handleRequest CHECK_SEQ -> isVBOK not OK -> executeRbg failure)
+    from events that arrive in timestamp order, without keeping the history of the LEs.
+    For every period p up to max_period the detector counts how many of the latest events of an LE equal the event
+    p positions before them. That count grows by one per event or drops to 0, so it costs max_period comparisons
+    per event and the count itself is the length of the repeated run. A loop is detected once the smallest
+    period p with count >= (min_repetitions - 1) * p is found: detected is called right away with the loop so far,
+    and the full loop (start, end, period, repetitions) is emitted when the cycle breaks or the LE goes idle.
+    Per active LE only the last max_period * min_repetitions signatures are kept.
+    Sample usage:
+    detector = LoopDetector(detected=print)
+    detector.add(timestamp, le, detector.signature('isVBOK not OK False'))
+    '''
+    def __init__(self, max_period=16, min_repetitions=5, idle_timeout_ms=3600 * 1000, emit=None, detected=None):
+        self.max_period = max_period
+        self.min_repetitions = min_repetitions
+        self.window = max_period * min_repetitions
+        self.idle_timeout_ms = idle_timeout_ms
+        self.active = OrderedDict()
+        self.rows = []
+        self.emit = emit or self.rows.append
+        self.detected = detected
+        # signature text <-> small int, so the window compares ints
+        self.signature_ids = {}
+        self.names = []
+
+    def signature(self, name):
+        signature = self.signature_ids.get(name)
+        if signature is None:
+            signature = self.signature_ids[name] = len(self.names)
+            self.names.append(name)
+        return signature
+
+    def add(self, timestamp, le, signature):
+        self.expire(timestamp)
+        state = self.active.get(le)
+        if state is None:
+            state = self.active[le] = LeLoopState(le, self.window, self.max_period)
+        else:
+            self.active.move_to_end(le)
+        state.last_seen = timestamp
+
+        signatures, matches = state.signatures, state.matches
+        for p in range(1, min(len(signatures), self.max_period) + 1):
+            matches[p] = matches[p] + 1 if signatures[-p] == signature else 0
+        signatures.append(signature)
+        state.timestamps.append(timestamp)
+
+        if state.period:
+            p = state.period
+            if matches[p]:
+                state.end = timestamp
+                state.events = matches[p] + p
+                state.repetitions = state.events // p
+                return
+            self.emit(state.row(self.names))
+            state.period = 0
+
+        for p in range(1, self.max_period + 1):
+            if matches[p] >= (self.min_repetitions - 1) * p:
+                state.period = p
+                state.events = min(matches[p] + p, len(signatures))
+                state.repetitions = state.events // p
+                state.start = state.timestamps[-state.events]
+                state.end = timestamp
+                state.cycle = tuple(signatures)[-p:]
+                if self.detected:
+                    self.detected(state.row(self.names))
+                break
+
+    def expire(self, now):
+        while self.active:
+            le, state = next(iter(self.active.items()))
+            if now - state.last_seen <= self.idle_timeout_ms:
+                break
+            del self.active[le]
+            if state.period:
+                self.emit(state.row(self.names))
+
+    def finish(self):
+        for state in self.active.values():
+            if state.period:
+                self.emit(state.row(self.names))
+        self.active.clear()
+
+
+def table_signatures(name, detector, output_format='pickle'):
+    '''
+    Yields (timestamp in ms, le, signature) for the rows of one output table,
+    the signature is the logger function of the table with the values of its SIGNATURES columns.
+    '''
+    function_name, signature_columns = SIGNATURES[name]
+    columns = ['timestamp', LE_COLUMNS[name]] + signature_columns
+    for df in table_frames(name, columns, output_format):
+        ts, le, rows = le_rows(df, name)
+        text = pd.Series(function_name, index=df.index)
+        for column in signature_columns:
+            # missing values stay NaN in astype(str), factorize would give them the code -1
+            text = text + ' ' + df[column].astype(str).fillna('None').str.strip()
+        # LE ids in the failure texts (current LHM 1849002) would make every LE a different signature
+        text = text.str.replace(large_id_pattern, '*', regex=True)
+        # only the distinct signatures of the batch go through the dict
+        codes, uniques = pd.factorize(text.to_numpy()[rows])
+        ids = np.array([detector.signature(u) for u in uniques], dtype=np.int64)
+        yield from zip(ts.tolist(), le.tolist(), ids[codes].tolist() if len(ids) else [])
+
+
+def find_loops(output_format='pickle', max_period=16, min_repetitions=5, idle_timeout_s=3600, detected=None):
+    '''
+    Merges the event tables in timestamp order and returns one row per loop.
+    Sample usage:
+    loops = find_loops()
+    loops.sort_values('repetitions', ascending=False).head(20)
+    '''
+    detector = LoopDetector(max_period, min_repetitions, idle_timeout_s * 1000, detected=detected)
+    streams = [table_signatures(name, detector, output_format) for name in SIGNATURES
+               if os.path.exists(request_filename(name, output_format))]
+    for timestamp, le, signature in heapq.merge(*streams, key=lambda e: e[0]):
+        detector.add(timestamp, le, signature)
+    detector.finish()
+
+    df = pd.DataFrame(detector.rows, columns=['le', 'start', 'end', 'period', 'repetitions', 'events', 'cycle'])
+    df['start'] = pd.to_datetime(df['start'], unit='ms')
+    df['end'] = pd.to_datetime(df['end'], unit='ms')
+    df['duration_sec'] = (df['end'] - df['start']).dt.total_seconds()
+    return df.sort_values(['start', 'le'], kind='stable', ignore_index=True)
+
+
+def print_detection(loop):
+    print(f"{pd.to_datetime(loop['start'], unit='ms')} LE {loop['le']}: period {loop['period']} "
+          f"x{loop['repetitions']} ({loop['cycle']})")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Find LEs stuck in repeated event cycles in the extracted tables')
+    parser.add_argument('--format', default='pickle', choices=['pickle', 'parquet', 'feather'])
+    parser.add_argument('--max-period', type=int, default=16, help='longest cycle in events')
+    parser.add_argument('--min-repetitions', type=int, default=5, help='repetitions of a cycle before it is a loop')
+    parser.add_argument('--idle-timeout', type=int, default=3600,
+                        help='seconds without an event after which the state of an LE is dropped')
+    parser.add_argument('--verbose', action='store_true', help='print every loop when it is detected')
+    args = parser.parse_args()
+
+    loops = find_loops(args.format, args.max_period, args.min_repetitions, args.idle_timeout,
+                       print_detection if args.verbose else None)
+    write_frame(loops, LOOP_TABLE, args.format)
+    print(f"{len(loops)} loops of {loops['le'].nunique()} LEs written to {request_filename(LOOP_TABLE, args.format)}")
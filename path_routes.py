@@ -0,0 +1,108 @@
+import os
+import numpy as np
+import pandas as pd
+
+ROUTES_FILE = 'result/path_routes.npz'
+
+
+def encode_routes(rows, routes=None):
+    '''
+    Replaces the 'paths' column (hops) of the Path Movement Finished RecordTable with the id of the route in routes.
+    routes maps the hops tuple ((from, to), ...) to its id, new routes are added to it.
+    Only a few hundred different routes are searched in a week, so the hops are stored once per route.
+    '''
+    if routes is None:
+        routes = {}
+    paths = rows.pop_column('paths')
+    if paths is None:
+        return routes
+    route_ids = []
+    for hops in paths:
+        route = routes.get(hops)
+        if route is None:
+            route = routes[hops] = len(routes)
+        route_ids.append(route)
+    rows.add_column('route', route_ids)
+    return routes
+
+
+def save_routes(routes):
+    '''
+    Saves the routes CSR style: the hops of route i are hop_from/hop_to[offsets[i]:offsets[i + 1]].
+    '''
+    ordered = sorted(routes, key=routes.get)
+    lengths = np.array([len(hops) for hops in ordered], dtype=np.int64)
+    offsets = np.zeros(len(ordered) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    hops = np.array([hop for route in ordered for hop in route], dtype=np.int32).reshape(-1, 2)
+    np.savez_compressed(ROUTES_FILE, offsets=offsets, hop_from=hops[:, 0], hop_to=hops[:, 1])
+
+
+def load_routes():
+    '''
+    Returns the CSR arrays written by save_routes.
+    '''
+    with np.load(ROUTES_FILE) as routes:
+        return {key: routes[key] for key in routes.files}
+
+
+def route_dict(routes):
+    '''
+    Turns the CSR arrays back into the hops tuple -> id dict of encode_routes, to add the routes of new files.
+    '''
+    offsets, hop_from, hop_to = routes['offsets'], routes['hop_from'].astype(str), routes['hop_to'].astype(str)
+    return {tuple(zip(hop_from[start:end], hop_to[start:end])): route
+            for route, (start, end) in enumerate(zip(offsets[:-1], offsets[1:]))}
+
+
+def load_route_dict():
+    if not os.path.exists(ROUTES_FILE):
+        return {}
+    return route_dict(load_routes())
+
+
+def route_texts(routes):
+    '''
+    Returns one "1746 -> 1772, 1772 -> 1057" string per route id, "" for an empty route.
+    '''
+    offsets, hop_from, hop_to = routes['offsets'], routes['hop_from'], routes['hop_to']
+    return np.array([', '.join(f"{hop_from[k]} -> {hop_to[k]}" for k in range(start, end))
+                     for start, end in zip(offsets[:-1], offsets[1:])], dtype=object)
+
+
+def format_routes(route_ids, routes=None):
+    '''
+    Sample usage, gives the paths column the notebook worked with before:
+    dt_path_movement_finished['paths'] = format_routes(dt_path_movement_finished['route'])
+    '''
+    if routes is None:
+        routes = load_routes()
+    return pd.Series(route_texts(routes)[np.asarray(route_ids, dtype=np.int64)], index=getattr(route_ids, 'index', None))
+
+
+def path_detail(df, routes=None):
+    '''
+    Derives the former "Path Movement Finished - Detail" table (one row per hop with timestamp, mfs_id, order, from, to)
+    from the Path Movement Finished table.
+    Sample usage:
+    dt_path_movement_finished_detail = path_detail(dt_path_movement_finished)
+    '''
+    if routes is None:
+        routes = load_routes()
+    offsets = routes['offsets']
+    route_ids = df['route'].to_numpy(dtype=np.int64)
+    starts = offsets[route_ids]
+    lengths = offsets[route_ids + 1] - starts
+
+    # Hop k of the event i is hop starts[i] + k of the route
+    rows = np.repeat(np.arange(len(df)), lengths)
+    order = np.arange(len(rows)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    hops = np.repeat(starts, lengths) + order
+
+    return pd.DataFrame({
+        'timestamp': df['timestamp'].to_numpy()[rows],
+        'mfs_id': df['mfs_id'].to_numpy()[rows],
+        'order': order + 1,
+        'from': routes['hop_from'][hops],
+        'to': routes['hop_to'][hops],
+    })
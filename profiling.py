@@ -0,0 +1,142 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+PROFILE_FILE = 'result/profile.json'
+
+
+class ExtractionProfile:
+    '''
+    Collects the timings of one extraction run for extraction.py --profile and writes them to result/profile.json.
+    Stages are always timed (a few calls per run). The per line parts only cost something after wrap_handlers
+    and wrap_function replaced the handlers and module functions with timed versions, which only happens with --profile.
+    '''
+    def __init__(self):
+        self.stages = {}
+        # wrapped module function -> calls, seconds
+        self.calls = {}
+        # logger function -> lines, seconds, unknown
+        self.functions = {}
+        # output table -> rows, seconds, frame_seconds, bytes
+        self.tables = {}
+        # the persister thread writes tables while the main thread builds the next ones
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = round(time.perf_counter() - start, 3)
+
+    def wrap_function(self, namespace, name):
+        '''
+        Replaces namespace[name] (e.g. globals() of extraction.py) with a version that counts its calls and time.
+        '''
+        func = namespace[name]
+        stats = self.calls.setdefault(name, {'calls': 0, 'seconds': 0.0})
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                seconds = time.perf_counter() - start
+                with self.lock:
+                    stats['calls'] += 1
+                    stats['seconds'] += seconds
+                thread_seconds = self.thread_seconds()
+                thread_seconds[name] = thread_seconds.get(name, 0.0) + seconds
+
+        namespace[name] = timed
+
+    def thread_seconds(self):
+        # wrapped module function -> seconds spent in it by the calling thread
+        if not hasattr(self.local, 'seconds'):
+            self.local.seconds = {}
+        return self.local.seconds
+
+    def wrap_handlers(self, handlers):
+        '''
+        Replaces the handlers of the HANDLERS dict with versions that count lines, time and misses per logger function.
+        '''
+        for function_name, handler in handlers.items():
+            handlers[function_name] = self.timed_handler(function_name, handler)
+
+    def timed_handler(self, function_name, handler):
+        stats = self.functions.setdefault(function_name, {'lines': 0, 'seconds': 0.0, 'unknown': 0})
+
+        def timed(parsed, content, results, state):
+            start = time.perf_counter()
+            handled = handler(parsed, content, results, state)
+            stats['seconds'] += time.perf_counter() - start
+            stats['lines'] += 1
+            if not handled:
+                stats['unknown'] += 1
+            return handled
+
+        return timed
+
+    def count_unhandled(self, stage_lines, handlers):
+        # Logger functions without a handler only show up in Unknown Content, stage_lines counts its rows per function
+        for function_name, lines in stage_lines.items():
+            if function_name not in handlers:
+                stats = self.functions.setdefault(function_name, {'lines': 0, 'seconds': 0.0, 'unknown': 0})
+                stats['lines'] += lines
+                stats['unknown'] += lines
+
+    @contextmanager
+    def table(self, name, rows, path):
+        '''
+        Times building and writing one output table, frame_seconds is the part spent in write_frame (serialization)
+        if it is wrapped. Only the write_frame calls of the calling thread count. A table written by the persister
+        thread is timed there again with rows=None, both parts are added up.
+        '''
+        frame_before = self.thread_seconds().get('write_frame', 0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            frame_seconds = self.thread_seconds().get('write_frame', 0.0) - frame_before
+            with self.lock:
+                stats = self.tables.setdefault(name, {'rows': None, 'seconds': 0.0, 'frame_seconds': None, 'bytes': None})
+                if rows is not None:
+                    stats['rows'] = rows
+                stats['seconds'] += seconds
+                if 'write_frame' in self.calls:
+                    stats['frame_seconds'] = (stats['frame_seconds'] or 0.0) + frame_seconds
+                if os.path.exists(path):
+                    stats['bytes'] = os.path.getsize(path)
+
+    def report(self, **info):
+        functions = {}
+        for function_name, stats in sorted(self.functions.items(), key=lambda item: -item[1]['lines']):
+            functions[function_name] = {
+                'lines': stats['lines'],
+                'seconds': round(stats['seconds'], 3),
+                'unknown': stats['unknown'],
+                'miss_rate': round(stats['unknown'] / stats['lines'], 4) if stats['lines'] else None,
+            }
+        report = {'date': datetime.now().isoformat(timespec='seconds')}
+        report.update(info)
+        report['lines'] = sum(stats['lines'] for stats in functions.values()) if functions else None
+        report['stages'] = self.stages
+        report['calls'] = {name: {'calls': stats['calls'], 'seconds': round(stats['seconds'], 3)}
+                           for name, stats in self.calls.items()}
+        report['functions'] = functions
+        report['tables'] = {
+            name: dict(stats, seconds=round(stats['seconds'], 3),
+                       frame_seconds=round(stats['frame_seconds'], 3) if stats['frame_seconds'] is not None else None)
+            for name, stats in self.tables.items()
+        }
+        return report
+
+    def save(self, path=PROFILE_FILE, **info):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(**info), f, indent=1)
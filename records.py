@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+
+# Placeholder for a column that a row does not have, it becomes NaN in the DataFrame like with a list of dicts
+MISSING = object()
+
+
+class RecordTable:
+    '''
+    The parsed rows of one output table, kept column-wise: one list per column instead of one dict per row.
+    Rows are appended as dicts like the handlers build them, rows without a column get MISSING in it.
+    Values of the interned columns (few distinct values like thread, stage or task_type) are stored once
+    per table and shared by the rows. to_frame builds the DataFrame from the columns, the same one as
+    pd.DataFrame of the dicts. Iterating yields the rows as dicts again.
+    Sample usage:
+    table = RecordTable(['thread', 'stage'])
+    table.append({'timestamp': '2025.02.07 10:00:00.066', 'thread': 'MF1', 'stage': 'rbg'})
+    df = table.to_frame()
+    '''
+    def __init__(self, interned=()):
+        self.interned = frozenset(interned)
+        self.columns = {}
+        # columns that hold MISSING for some rows
+        self.padded = set()
+        # column -> {value: value} for the interned columns
+        self.pools = {}
+        self.rows = 0
+
+    def add_column(self, name, values=None):
+        if values is None:
+            values = [MISSING] * self.rows
+            if self.rows:
+                self.padded.add(name)
+        self.columns[name] = values
+        if name in self.interned:
+            self.pools.setdefault(name, {})
+        return values
+
+    def append(self, parsed):
+        columns = self.columns
+        pools = self.pools
+        for key, value in parsed.items():
+            column = columns.get(key)
+            if column is None:
+                column = self.add_column(key)
+            pool = pools.get(key)
+            if pool is not None and value is not None:
+                value = pool.setdefault(value, value)
+            column.append(value)
+        self.rows += 1
+        if len(columns) > len(parsed):
+            # columns of earlier rows that this row does not have
+            for name, column in columns.items():
+                if len(column) < self.rows:
+                    column.append(MISSING)
+                    self.padded.add(name)
+
+    def __len__(self):
+        return self.rows
+
+    def __iter__(self):
+        names = list(self.columns)
+        for values in zip(*self.columns.values()):
+            if self.padded:
+                yield {name: value for name, value in zip(names, values) if value is not MISSING}
+            else:
+                yield dict(zip(names, values))
+
+    def column(self, name):
+        # the values of one column with None for the rows that do not have it
+        column = self.columns.get(name)
+        if column is None:
+            return [None] * self.rows
+        if name in self.padded:
+            return [None if value is MISSING else value for value in column]
+        return column
+
+    def pop_column(self, name):
+        self.padded.discard(name)
+        return self.columns.pop(name, None)
+
+    def clear(self):
+        self.columns = {}
+        self.padded = set()
+        self.rows = 0
+
+    def reorder(self, order):
+        # order: the row positions in their new order
+        for name, column in self.columns.items():
+            self.columns[name] = [column[k] for k in order]
+
+    def to_frame(self):
+        columns = self.columns
+        if self.padded:
+            columns = dict(columns)
+            for name in self.padded:
+                columns[name] = [np.nan if value is MISSING else value for value in columns[name]]
+        return pd.DataFrame(columns)
+
+    @classmethod
+    def merge(cls, tables, key='timestamp'):
+        '''
+        Merges tables that are each sorted by key into one table sorted by key. Rows with the same key keep
+        the order of the tables, like heapq.merge.
+        '''
+        merged = cls(set().union(*(table.interned for table in tables)))
+        tables = [table for table in tables if table.rows]
+        if not tables:
+            return merged
+        keys = []
+        for table in tables:
+            keys.extend(table.column(key))
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        position = [0] * len(order)
+        for new, old in enumerate(order):
+            position[old] = new
+
+        # columns in the order the merged dicts first have them, like a DataFrame of the merged dicts
+        first_seen = {}
+        offset = 0
+        for table in tables:
+            table_first = min(position[offset:offset + table.rows])
+            for rank, (name, column) in enumerate(table.columns.items()):
+                if name in table.padded:
+                    first = min(position[offset + k] for k, value in enumerate(column) if value is not MISSING)
+                else:
+                    first = table_first
+                seen = (first, rank)
+                if name not in first_seen or seen < first_seen[name]:
+                    first_seen[name] = seen
+            offset += table.rows
+
+        merged.rows = len(order)
+        for name in sorted(first_seen, key=first_seen.get):
+            values = []
+            for table in tables:
+                column = table.columns.get(name)
+                values.extend(column if column is not None else [MISSING] * table.rows)
+            merged.add_column(name, [values[k] for k in order])
+            if any(name in table.padded or name not in table.columns for table in tables):
+                merged.padded.add(name)
+        return merged
@@ -0,0 +1,241 @@
+import heapq
+import calendar
+import time
+
+import pandas as pd
+
+LATENCY_TABLE = 'Handle Request Latency'
+PERCENTILE_TABLE = 'Handle Request Percentiles'
+PERCENTILES = [50, 95, 99]
+# Histogram groups -> key of one pair row
+HISTOGRAM_GROUPS = {
+    'request': lambda row: row['request'],
+    'area': lambda row: row['area'],
+    'hour': lambda row: row['timestamp'][:13],
+}
+
+# Start of day in ms per date part of the timestamps, e.g. '2025.02.06'
+day_start_ms = {}
+
+
+def timestamp_ms(timestamp):
+    '''
+    Milliseconds since the epoch of a log timestamp like '2025.02.06 05:58:11.600', the log time is taken as is
+    (no time zone, like the datetime64 values of the tables and ts_ms of le_index.py).
+    '''
+    day = timestamp[:10]
+    start = day_start_ms.get(day)
+    if start is None:
+        start = day_start_ms[day] = calendar.timegm(time.strptime(day, '%Y.%m.%d')) * 1000
+    return (start + int(timestamp[11:13]) * 3600000 + int(timestamp[14:16]) * 60000 + int(timestamp[17:19]) * 1000
+            + int(timestamp[20:23].ljust(3, '0')))
+
+
+def to_ms(response_time):
+    # '15ms' or '15', None if missing
+    if response_time is None:
+        return None
+    try:
+        return int(str(response_time).removesuffix('ms'))
+    except ValueError:
+        return None
+
+
+class LatencyHistogram:
+    '''
+    HDR-style histogram of millisecond values: values below 2**precision_bits are counted exactly,
+    larger values in buckets of relative width 2**-precision_bits (under 1% with the default 7 bits),
+    so the size only grows with the logarithm of the largest value.
+    Sample usage:
+    histogram = LatencyHistogram()
+    histogram.add(15)
+    histogram.percentile(99)
+    '''
+    def __init__(self, precision_bits=7):
+        self.precision_bits = precision_bits
+        # lower bound of the bucket -> values
+        self.counts = {}
+        self.count = 0
+        self.max = 0
+
+    def add(self, value):
+        value = max(int(value), 0)
+        shift = max(value.bit_length() - self.precision_bits, 0)
+        lower = (value >> shift) << shift
+        self.counts[lower] = self.counts.get(lower, 0) + 1
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        for lower, count in other.counts.items():
+            self.counts[lower] = self.counts.get(lower, 0) + count
+        self.count += other.count
+        self.max = max(self.max, other.max)
+
+    def percentile(self, q):
+        '''
+        Highest value of the bucket that holds the q-th percentile, None if the histogram is empty.
+        '''
+        if not self.count:
+            return None
+        rank = max(q / 100 * self.count, 1)
+        seen = 0
+        for lower in sorted(self.counts):
+            seen += self.counts[lower]
+            if seen >= rank:
+                shift = max(lower.bit_length() - self.precision_bits, 0)
+                return min(lower + (1 << shift) - 1, self.max)
+        return self.max
+
+
+class RequestPairer:
+    '''
+    Pairs START and END HANDLE REQUEST rows that arrive in timestamp order by operation_num, request, area and mfs_id.
+    Pending STARTs are kept in a dict in arrival order, a START without END after timeout_ms is emitted as a timeout,
+    so only the requests of the last timeout_ms are kept. Every pair goes into the latency histograms of its
+    request type, area and hour.
+    '''
+    def __init__(self, timeout_ms=60000, emit=None):
+        self.timeout_ms = timeout_ms
+        # key -> STARTs in arrival order, and all pending STARTs by arrival number for the timeouts
+        self.pending = {}
+        self.pending_order = {}
+        self.started = 0
+        self.unmatched_ends = 0
+        self.histograms = {}
+        self.timeouts = {}
+        self.rows = []
+        self.emit = emit or self.rows.append
+
+    def add_start(self, start):
+        start_ms = timestamp_ms(start['timestamp'])
+        self.expire(start_ms)
+        key = (start['operation_num'], start['request'], start['area'], start['mfs_id'])
+        self.pending.setdefault(key, []).append(self.started)
+        self.pending_order[self.started] = (start_ms, key, start)
+        self.started += 1
+
+    def add_end(self, end):
+        end_ms = timestamp_ms(end['timestamp'])
+        self.expire(end_ms)
+        key = (end['operation_num'], end['request'], end['area'], end['mfs_id'])
+        started = self.pending.get(key)
+        if not started:
+            # START before the processed logs or already timed out
+            self.unmatched_ends += 1
+            return
+        start_ms, _, start = self.pending_order.pop(started.pop(0))
+        if not started:
+            del self.pending[key]
+
+        row = self.row(start, end)
+        row['duration_ms'] = end_ms - start_ms
+        self.record(row)
+        self.emit(row)
+
+    def record(self, row):
+        # the response time logged by the SequencePlanner, the timestamp delta if it is missing
+        if row['timeout']:
+            for group, key_of in HISTOGRAM_GROUPS.items():
+                self.timeouts[(group, key_of(row))] = self.timeouts.get((group, key_of(row)), 0) + 1
+            return
+        value = to_ms(row['response_time'])
+        if value is None:
+            if pd.isna(row['duration_ms']):
+                return
+            value = row['duration_ms']
+        for group, key_of in HISTOGRAM_GROUPS.items():
+            histogram = self.histograms.get((group, key_of(row)))
+            if histogram is None:
+                histogram = self.histograms[(group, key_of(row))] = LatencyHistogram()
+            histogram.add(value)
+
+    def row(self, start, end=None):
+        return {
+            'timestamp': start['timestamp'],
+            'end_timestamp': end['timestamp'] if end else None,
+            'thread': start['thread'],
+            'operation_num': start['operation_num'],
+            'request': start['request'],
+            'area': start['area'],
+            'mfs_id': start['mfs_id'],
+            'force_check': start['force_check'],
+            'result': end['result'] if end else None,
+            'response_time': end['response_time'] if end else None,
+            'duration_ms': None,
+            'timeout': end is None,
+        }
+
+    def timeout(self, number):
+        _, key, start = self.pending_order.pop(number)
+        started = self.pending[key]
+        started.remove(number)
+        if not started:
+            del self.pending[key]
+        row = self.row(start)
+        self.record(row)
+        self.emit(row)
+
+    def expire(self, now):
+        while self.pending_order:
+            number, (start_ms, _, _) = next(iter(self.pending_order.items()))
+            if now - start_ms <= self.timeout_ms:
+                break
+            self.timeout(number)
+
+    def finish(self):
+        # the END of the last requests is not in the processed logs
+        while self.pending_order:
+            self.timeout(next(iter(self.pending_order)))
+
+    @classmethod
+    def from_table(cls, df):
+        '''
+        Fills the histograms from a Handle Request Latency table, e.g. after an incremental run appended to it.
+        '''
+        pairer = cls()
+        if pd.api.types.is_datetime64_any_dtype(df['timestamp']):
+            df = df.assign(timestamp=df['timestamp'].dt.strftime('%Y.%m.%d %H:%M:%S.%f').str[:23])
+        for row in df.to_dict('records'):
+            pairer.record(row)
+        return pairer
+
+    def percentiles(self):
+        '''
+        One row per request type, area and hour with the requests, timeouts and latency percentiles in ms.
+        '''
+        rows = []
+        for group_key in sorted(set(self.histograms) | set(self.timeouts)):
+            histogram = self.histograms.get(group_key, LatencyHistogram())
+            row = {'group': group_key[0], 'key': group_key[1], 'requests': histogram.count,
+                   'timeouts': self.timeouts.get(group_key, 0)}
+            for q in PERCENTILES:
+                row[f"p{q}_ms"] = histogram.percentile(q)
+            row['max_ms'] = histogram.max if histogram.count else None
+            rows.append(row)
+        df = pd.DataFrame(rows, columns=['group', 'key', 'requests', 'timeouts']
+                          + [f"p{q}_ms" for q in PERCENTILES] + ['max_ms'])
+        for column in [f"p{q}_ms" for q in PERCENTILES] + ['max_ms']:
+            df[column] = df[column].astype('Int64')
+        return df
+
+
+def pair_requests(starts, ends, timeout_ms=60000):
+    '''
+    Pairs the rows of the Start and End Handle Request tables of parse_log_lines in one pass.
+    Returns the pair rows (timeouts included) ordered by the START timestamp and the RequestPairer with the histograms.
+    Sample usage:
+    rows, pairer = pair_requests(results['Start Handle Request'], results['End Handle Request'])
+    pairer.percentiles()
+    '''
+    pairer = RequestPairer(timeout_ms)
+    # STARTs first when START and END have the same timestamp, heapq.merge keeps the order of the inputs
+    for is_end, parsed in heapq.merge(((False, start) for start in starts), ((True, end) for end in ends),
+                                      key=lambda event: event[1]['timestamp']):
+        if is_end:
+            pairer.add_end(parsed)
+        else:
+            pairer.add_start(parsed)
+    pairer.finish()
+    pairer.rows.sort(key=lambda row: row['timestamp'])
+    return pairer.rows, pairer
@@ -0,0 +1,174 @@
+import os
+
+import pandas as pd
+
+from extraction import read_request, request_filename, write_frame
+from request_latency import to_ms
+
+# Grain -> output table, the 1 minute rollup is counted from the rows, the others from the 1 minute rollup
+ROLLUP_GRAINS = {
+    '1min': 'Rollup 1min',
+    '15min': 'Rollup 15min',
+    '1h': 'Rollup 1h',
+}
+
+# Output table -> columns the rows are counted by, besides thread and info_code
+ROLLUP_DIMENSIONS = {
+    'Execute RBG': ['task_type', 'category', 'telegram_type'],
+    'Start Handle Request': ['request', 'area'],
+    'End Handle Request': ['request', 'area', 'result'],
+    'Is VB OK': ['vb_status', 'result'],
+    'Path Movement Finished': ['status', 'code'],
+    'Path Movement Failed': ['failcode'],
+    'Unknown Content': ['stage'],
+    'Alerts Received': ['alert_name'],
+    'Alerts Processing': ['alert_name'],
+    'Alerts Handled': ['alert_name'],
+    'Telegrams Processed': ['alert_name', 'success'],
+    'Telegrams Sent': ['alert_name', 'success'],
+    'Check Sequence': ['sequence_status', 'id_status'],
+    'Check Position': [],
+    'Get Set NIO': ['send_to'],
+}
+# Output table -> columns with a value in ms that get a sum and a max per cell
+ROLLUP_MEASURES = {
+    'End Handle Request': ['response_time'],
+    'Alerts Handled': ['time_ms'],
+}
+DIMENSIONS = ['thread', 'info_code'] + sorted({column for columns in ROLLUP_DIMENSIONS.values() for column in columns})
+MEASURES = sorted({column for columns in ROLLUP_MEASURES.values() for column in columns})
+
+
+def count_rows(rows, name, cells=None):
+    '''
+    Counts the parsed rows (a RecordTable) of one output table per minute and dimension values in one pass
+    over its columns, the minute is the prefix of the timestamp string, e.g. '2025.02.06 05:58'.
+    Returns the dict (minute, dimension values...) -> [rows, sum, max of every measure],
+    rows are added to cells if given, to count a table in several parts.
+    '''
+    dimensions = ['thread', 'info_code'] + ROLLUP_DIMENSIONS[name]
+    measures = ROLLUP_MEASURES.get(name, [])
+    if cells is None:
+        cells = {}
+    columns = [rows.column(column) for column in dimensions + measures]
+    for timestamp, *values in zip(rows.column('timestamp'), *columns):
+        key = (timestamp[:16],) + tuple(values[:len(dimensions)])
+        cell = cells.get(key)
+        if cell is None:
+            cell = cells[key] = [0] + [0, None] * len(measures)
+        cell[0] += 1
+        for k, value in enumerate(values[len(dimensions):]):
+            value = to_ms(value)
+            if value is not None:
+                cell[1 + 2 * k] += value
+                cell[2 + 2 * k] = value if cell[2 + 2 * k] is None else max(cell[2 + 2 * k], value)
+    return cells
+
+
+def merge_cells(cells, other):
+    '''
+    Adds the count_rows cells of other to cells, e.g. the counts of one file parsed in a worker process.
+    '''
+    for key, other_cell in other.items():
+        cell = cells.get(key)
+        if cell is None:
+            cells[key] = list(other_cell)
+            continue
+        cell[0] += other_cell[0]
+        for k in range(1, len(cell), 2):
+            cell[k] += other_cell[k]
+            if other_cell[k + 1] is not None:
+                cell[k + 1] = other_cell[k + 1] if cell[k + 1] is None else max(cell[k + 1], other_cell[k + 1])
+    return cells
+
+
+def minute_rollup(results, counted=None):
+    '''
+    The 1 minute rollup of the parse_log_lines results: one row per minute, table and dimension values
+    with the rows and the sum and max of the measures.
+    counted has the count_rows cells of tables whose rows are not kept in results (Unknown Content).
+    '''
+    counted = counted or {}
+    frames = []
+    for name in ROLLUP_DIMENSIONS:
+        cells = counted[name] if name in counted else count_rows(results[name], name)
+        if not cells:
+            continue
+        dimensions = ['thread', 'info_code'] + ROLLUP_DIMENSIONS[name]
+        measures = ROLLUP_MEASURES.get(name, [])
+        columns = ['bucket'] + dimensions + ['rows'] + [f"{m}_{f}" for m in measures for f in ('sum', 'max')]
+        df = pd.DataFrame([key + tuple(cell) for key, cell in cells.items()], columns=columns)
+        df.insert(1, 'table', name)
+        frames.append(df)
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=['bucket', 'table', 'rows'])
+    df['bucket'] = pd.to_datetime(df['bucket'], format='%Y.%m.%d %H:%M')
+    return normalize(df)
+
+
+def normalize(df):
+    # Same columns and dtypes for every rollup, dimension values are strings as in the pickled tables
+    for column in DIMENSIONS:
+        df[column] = df[column].astype(object).where(df[column].notna(), None).map(
+            lambda value: None if value is None else str(value)) if column in df.columns else None
+    for measure in MEASURES:
+        for column in (f"{measure}_sum", f"{measure}_max"):
+            df[column] = df[column].astype('Int64') if column in df.columns else pd.array([None] * len(df), dtype='Int64')
+    df['rows'] = df['rows'].astype('int64')
+    columns = ['bucket', 'table'] + DIMENSIONS + ['rows'] + [f"{m}_{f}" for m in MEASURES for f in ('sum', 'max')]
+    return df[columns]
+
+
+def aggregate(df, grain):
+    '''
+    Rolls df up to a coarser grain, rows and sums are added, maxima are the max of the maxima.
+    '''
+    df = df.assign(bucket=df['bucket'].dt.floor(grain))
+    aggregations = {'rows': 'sum'}
+    for measure in MEASURES:
+        aggregations[f"{measure}_sum"] = 'sum'
+        aggregations[f"{measure}_max"] = 'max'
+    df = df.groupby(['bucket', 'table'] + DIMENSIONS, dropna=False, sort=False, observed=True).agg(aggregations)
+    df = df.reset_index().sort_values(['bucket', 'table'], kind='stable', ignore_index=True)
+    # sums of cells without any value stay empty
+    for measure in MEASURES:
+        df.loc[df[f"{measure}_max"].isna(), f"{measure}_sum"] = pd.NA
+    return normalize(df)
+
+
+def build_rollups(results, counted=None):
+    '''
+    Returns grain -> rollup DataFrame for the parse_log_lines results.
+    '''
+    minute = minute_rollup(results, counted).sort_values(['bucket', 'table'], kind='stable', ignore_index=True)
+    rollups = {'1min': minute}
+    for grain in ROLLUP_GRAINS:
+        if grain != '1min':
+            rollups[grain] = aggregate(minute, grain)
+    return rollups
+
+
+def write_rollups(rollups, output_format='pickle', append=False):
+    for grain, df in rollups.items():
+        name = ROLLUP_GRAINS[grain]
+        if append and os.path.exists(request_filename(name, output_format)):
+            # buckets at the edge of the earlier run are added up with the new rows
+            df = aggregate(pd.concat([normalize(read_request(name, output_format)), df], ignore_index=True), grain)
+        if output_format != 'pickle':
+            df = df.astype({column: 'category' for column in ['table'] + DIMENSIONS})
+        write_frame(df, name, output_format)
+
+
+def read_rollup(grain='1min', table=None, output_format='pickle'):
+    '''
+    Reads one rollup, only the rows of table if given.
+    Sample usage:
+    rbg = read_rollup('15min', 'Execute RBG')
+    rbg.groupby(['bucket', 'task_type'])['rows'].sum().unstack()
+    '''
+    name = ROLLUP_GRAINS[grain]
+    if output_format == 'parquet' and table is not None:
+        return pd.read_parquet(request_filename(name, output_format), filters=[('table', '==', table)])
+    df = read_request(name, output_format)
+    if table is not None:
+        df = df[df['table'] == table].reset_index(drop=True)
+    return df
@@ -0,0 +1,114 @@
+import os
+import json
+import time
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pyarrow as pa
+
+# POSIX shared memory is a tmpfs, files in it live in RAM and are mapped by the readers without copying
+SHARED_DIR = os.path.join('/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), 'mfs-results')
+CATALOG_FILE = 'catalog.json'
+SHARED_BATCH_SIZE = 100000
+
+
+def shared_filename(name, directory=SHARED_DIR):
+    return os.path.join(directory, name + '.arrow')
+
+
+def replace_file(path, write):
+    # write to a temporary file and rename it, readers see the old or the new file but never a partial one.
+    # Readers that still map the old file keep its memory until they drop it.
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def publish_table(df, name, directory=SHARED_DIR):
+    '''
+    Writes one typed output table as an uncompressed Arrow IPC file of record batches to directory.
+    Returns its catalog entry.
+    '''
+    os.makedirs(directory, exist_ok=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    def write(path):
+        with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=SHARED_BATCH_SIZE)
+
+    path = shared_filename(name, directory)
+    replace_file(path, write)
+    return {'file': os.path.basename(path), 'rows': table.num_rows, 'columns': table.column_names,
+            'bytes': os.path.getsize(path)}
+
+
+def save_catalog(tables, directory=SHARED_DIR, **info):
+    '''
+    Writes the catalog of the published tables, analysis processes only attach to tables listed in it.
+    '''
+    catalog = {'published': time.strftime('%Y-%m-%dT%H:%M:%S'), **info, 'tables': tables}
+    os.makedirs(directory, exist_ok=True)
+
+    def write(path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(catalog, f, indent=2)
+
+    replace_file(os.path.join(directory, CATALOG_FILE), write)
+
+
+def load_catalog(directory=SHARED_DIR):
+    path = os.path.join(directory, CATALOG_FILE)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No published tables in {directory}, run extraction.py --shared first")
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def attach_table(name, directory=SHARED_DIR, columns=None):
+    '''
+    Maps one published table without reading or copying it, returns a pyarrow Table backed by the shared memory.
+    Sample usage:
+    table = attach_table('Execute RBG', columns=['timestamp', 'le'])
+    le = table['le'].to_numpy()
+    '''
+    entry = load_catalog(directory)['tables'].get(name)
+    if entry is None:
+        raise KeyError(f"Table '{name}' is not in the catalog of {directory}")
+    source = pa.memory_map(os.path.join(directory, entry['file']), 'r')
+    table = pa.ipc.open_file(source).read_all()
+    return table.select(columns) if columns is not None else table
+
+
+def read_shared(name, directory=SHARED_DIR, columns=None):
+    '''
+    A published table as a DataFrame with the same dtypes as the parquet and feather tables.
+    Numeric columns without missing values share the mapped memory, strings and nullable columns are copied.
+    '''
+    return attach_table(name, directory, columns).to_pandas()
+
+
+class AsyncPersister:
+    '''
+    Writes the output tables to disk in a background thread, in the order they were submitted,
+    while the extraction goes on with the next stages. gzip and the parquet encoder release the GIL
+    for most of the work. wait() returns once every submitted write is done and raises their first error.
+    Sample usage:
+    persister = AsyncPersister()
+    persister.submit(write_request, rows, 'Execute RBG', 'pickle')
+    persister.wait()
+    '''
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='persist')
+        self.futures = []
+
+    def submit(self, function, *args):
+        self.futures.append(self.executor.submit(function, *args))
+
+    def wait(self):
+        futures, self.futures = self.futures, []
+        for future in futures:
+            future.result()
+
+    def shutdown(self):
+        self.wait()
+        self.executor.shutdown()
@@ -0,0 +1,188 @@
+import re
+import random
+
+TEMPLATE_TABLE = 'Unknown Templates'
+WILDCARD = '<*>'
+
+# Operation numbers and numbers that are not part of a name (MFS_ID1=1847124 -> MFS_ID1=<*>)
+mask_patterns = [
+    re.compile(r'\bG\d{6,}\b'),
+    re.compile(r'(?<![A-Za-z_])-?\d+(?:[.,:]\d+)*'),
+]
+token_split_pattern = re.compile(r'[\s\\]+')
+digit_pattern = re.compile(r'\d')
+
+
+def template_tokens(text):
+    '''
+    Masks the numbers and ids of the first line of a message and splits it into tokens.
+    '''
+    line = text.split('\n', 1)[0] if text else ''
+    for pattern in mask_patterns:
+        line = pattern.sub(WILDCARD, line)
+    return [token for token in token_split_pattern.split(line) if token]
+
+
+def log_timestamp(value):
+    # typed output formats read the timestamps back as datetimes, the parsed rows have log timestamp strings
+    if isinstance(value, str):
+        return value
+    return value.strftime('%Y.%m.%d %H:%M:%S.%f')[:23]
+
+
+class LogTemplate:
+    __slots__ = ('stage', 'tokens', 'lines', 'first_seen', 'last_seen', 'info_codes', 'samples')
+
+    def __init__(self, stage, tokens):
+        self.stage = stage
+        self.tokens = tokens
+        self.lines = 0
+        self.first_seen = self.last_seen = None
+        self.info_codes = set()
+        self.samples = []
+
+    def row(self):
+        return {
+            'stage': self.stage,
+            'template': ' '.join(self.tokens),
+            'lines': self.lines,
+            'first_seen': self.first_seen,
+            'last_seen': self.last_seen,
+            'info_codes': ','.join(sorted(self.info_codes)),
+            'samples': list(self.samples),
+        }
+
+
+class TemplateMiner:
+    '''
+    Drain-style online clustering of the Unknown Content rows into templates per logger function.
+    Messages are masked (numbers, operation numbers), split into tokens and looked up by logger function,
+    token count and their first depth tokens; within that leaf the template with the most equal tokens wins if at
+    least similarity of the tokens are equal, tokens that differ become <*>. Every template keeps its line count,
+    first and last timestamp, info codes and a reservoir sample of sample_size raw messages, so memory depends on
+    the number of templates (at most max_templates) and not on the number of lines.
+    Sample usage:
+    miner = TemplateMiner()
+    miner.add_rows(results['Unknown Content'])
+    miner.merge(file_miner)
+    pd.DataFrame(miner.rows())
+    '''
+    def __init__(self, similarity=0.5, depth=2, max_children=100, sample_size=5, max_templates=10000, seed=0):
+        self.similarity = similarity
+        self.depth = depth
+        self.max_children = max_children
+        self.sample_size = sample_size
+        self.max_templates = max_templates
+        self.random = random.Random(seed)
+        # (stage, token count) -> prefix tokens -> templates
+        self.tree = {}
+        self.templates = []
+        # logger function -> lines, for extraction.py --profile
+        self.stage_lines = {}
+
+    def prefix(self, node, tokens):
+        key = tuple(WILDCARD if digit_pattern.search(token) else token for token in tokens[:self.depth])
+        if key not in node and len(node) >= self.max_children:
+            key = (WILDCARD,) * len(key)
+        return key
+
+    def match(self, stage, tokens):
+        node = self.tree.setdefault((stage, len(tokens)), {})
+        leaf = node.setdefault(self.prefix(node, tokens), [])
+        best, best_score = None, (-1, -1)
+        for template in leaf:
+            equal = sum(1 for a, b in zip(template.tokens, tokens) if a == b)
+            score = (equal, template.tokens.count(WILDCARD))
+            if score > best_score:
+                best, best_score = template, score
+        if best is not None and (not tokens or best_score[0] >= self.similarity * len(tokens)):
+            best.tokens = [a if a == b else WILDCARD for a, b in zip(best.tokens, tokens)]
+            return best
+        if len(self.templates) >= self.max_templates:
+            # no more templates, the rest of the leaf goes into one catch-all template
+            overflow = [template for template in leaf if all(token == WILDCARD for token in template.tokens)]
+            if overflow:
+                return overflow[0]
+            tokens = [WILDCARD] * len(tokens)
+        template = LogTemplate(stage, list(tokens))
+        leaf.append(template)
+        self.templates.append(template)
+        return template
+
+    def add(self, parsed):
+        stage = parsed['stage']
+        data = parsed.get('data')
+        data = data if isinstance(data, str) else ''
+        template = self.match(stage, template_tokens(data))
+
+        template.lines += 1
+        timestamp = parsed['timestamp']
+        if template.first_seen is None or timestamp < template.first_seen:
+            template.first_seen = timestamp
+        if template.last_seen is None or timestamp > template.last_seen:
+            template.last_seen = timestamp
+        template.info_codes.add(parsed['info_code'])
+        # reservoir sample: every message ends up in the sample with the same probability
+        if len(template.samples) < self.sample_size:
+            template.samples.append(data)
+        else:
+            k = self.random.randrange(template.lines)
+            if k < self.sample_size:
+                template.samples[k] = data
+        self.stage_lines[stage] = self.stage_lines.get(stage, 0) + 1
+
+    def add_rows(self, rows):
+        for parsed in rows:
+            self.add(parsed)
+
+    def merge(self, other):
+        '''
+        Adds the templates of another miner, e.g. the one of a file mined in a worker process. Every template is
+        matched like a message with its (masked) tokens, the counts and timestamps are added up and the samples are
+        drawn again from both, weighted by the lines they stand for.
+        '''
+        for source in other.templates:
+            template = self.match(source.stage, source.tokens)
+            if template.lines == 0:
+                template.samples = list(source.samples)
+            else:
+                template.samples = self.merge_samples(template, source)
+            template.lines += source.lines
+            if template.first_seen is None or source.first_seen < template.first_seen:
+                template.first_seen = source.first_seen
+            if template.last_seen is None or source.last_seen > template.last_seen:
+                template.last_seen = source.last_seen
+            template.info_codes |= source.info_codes
+        for stage, lines in other.stage_lines.items():
+            self.stage_lines[stage] = self.stage_lines.get(stage, 0) + lines
+
+    def merge_samples(self, template, source):
+        # weighted sample without replacement (Efraimidis-Spirakis), a sample stands for lines / samples lines
+        keyed = []
+        for part in (template, source):
+            if part.samples:
+                weight = part.lines / len(part.samples)
+                keyed.extend((self.random.random() ** (1 / weight), data) for data in part.samples)
+        keyed.sort(key=lambda item: item[0], reverse=True)
+        return [data for _, data in keyed[:self.sample_size]]
+
+    def load(self, rows):
+        '''
+        Adds the templates of an earlier run (rows of the Unknown Templates table), e.g. before an incremental run.
+        '''
+        for row in rows:
+            tokens = row['template'].split(' ') if row['template'] else []
+            node = self.tree.setdefault((row['stage'], len(tokens)), {})
+            template = LogTemplate(row['stage'], tokens)
+            template.lines = int(row['lines'])
+            template.first_seen, template.last_seen = log_timestamp(row['first_seen']), log_timestamp(row['last_seen'])
+            template.info_codes = set(row['info_codes'].split(',')) if row['info_codes'] else set()
+            template.samples = list(row['samples'])
+            node.setdefault(self.prefix(node, tokens), []).append(template)
+            self.templates.append(template)
+
+    def rows(self):
+        '''
+        One row per template, most frequent first.
+        '''
+        return sorted((template.row() for template in self.templates), key=lambda row: -row['lines'])
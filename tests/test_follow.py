@@ -0,0 +1,73 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from follow import LogFollower, create_buffers
+
+
+def nio_line(second, le_id):
+    return (f"[2025.02.07 10:00:{second:02d}.000 I MF1 G4{le_id} is.mfs.Nio.getAndSetNioDestination] "
+            f"id={le_id}: send to NIO=1746 (AUSSCHLEUSEN)\n")
+
+
+class LogFollowerTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix='mfs-follow-')
+        self.buffers = create_buffers(100, watched=())
+        self.follower = LogFollower(self.folder, self.buffers, from_start=True, flush_after=0)
+
+    def tearDown(self):
+        if self.follower.file:
+            self.follower.file.close()
+        shutil.rmtree(self.folder)
+
+    def write(self, name, text, mode='a'):
+        with open(os.path.join(self.folder, name), mode, encoding='utf-8') as f:
+            f.write(text)
+
+    def follow(self):
+        while self.follower.step():
+            pass
+        # flush_after=0: the last entry is parsed once there is no new data
+        self.follower.step()
+
+    def nio_ids(self):
+        return [row['id'] for row in self.buffers['Get Set NIO']]
+
+    def test_rotation_with_removed_old_file(self):
+        old = 'MFS-20250207-10-1.log'
+        self.write(old, nio_line(0, 1001))
+        self.follow()
+        self.assertEqual(self.nio_ids(), ['1001'])
+
+        # the rest of the hour (the last line without line end), then the next file is created
+        # and the old one is removed by the log rotation
+        self.write(old, nio_line(1, 1002) + nio_line(2, 1003).rstrip('\n'))
+        self.write('MFS-20250207-11-1.log', nio_line(3, 1004))
+        os.remove(os.path.join(self.folder, old))
+        self.follow()
+        self.assertEqual(self.follower.path, os.path.join(self.folder, 'MFS-20250207-11-1.log'))
+        self.assertEqual(self.nio_ids(), ['1001', '1002', '1003', '1004'])
+
+    def test_partial_line_and_truncation(self):
+        name = 'MFS-20250207-10-1.log'
+        line = nio_line(0, 1001)
+        self.write(name, line[:30])
+        self.follow()
+        self.assertEqual(self.nio_ids(), [])
+        self.write(name, line[30:])
+        self.follow()
+        self.assertEqual(self.nio_ids(), ['1001'])
+
+        # truncated and written again from the start, shorter than before
+        self.write(name, nio_line(1, 12), mode='w')
+        self.follow()
+        self.assertEqual(self.nio_ids(), ['1001', '12'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+import numpy as np
+import pandas as pd
+
+TOPOLOGY_FILE = 'AKL_complete.csv'
+UNREACHABLE = -1
+
+
+class TransportGraph:
+    '''
+    Conveyor topology of AKL_complete.csv as CSR arrays over integer point indices,
+    with the hop distance between all pairs of points.
+    The neighbor lists are used in both directions by default: the hops of the logged routes are only
+    all reachable that way, several neighbor lists name the next point but not the previous one.
+    Sample usage:
+    graph = TransportGraph.from_csv()
+    graph.distance_between(1118, 1725)
+    '''
+    def __init__(self, points, indptr, indices):
+        self.points = points
+        self.point_index = pd.Index(points)
+        # the numeric point ids sorted, to encode the int32 hops of path_routes with a binary search
+        numeric = sorted((int(name), k) for k, name in enumerate(points) if name.isdigit())
+        self.numeric_ids = np.array([point for point, _ in numeric], dtype=np.int64)
+        self.numeric_index = np.array([k for _, k in numeric], dtype=np.int64)
+        self.indptr = indptr
+        self.indices = indices
+        self.distance = self.all_pairs_distance()
+
+    @classmethod
+    def from_csv(cls, path=TOPOLOGY_FILE, directed=False):
+        df = pd.read_csv(path, dtype=str)
+        neighbors = df['Neighbors'].fillna('').str.split(',')
+
+        # points that only appear as a neighbor get an index too
+        names = list(df['Point'].str.strip())
+        edges = set()
+        for point, point_neighbors in zip(names, neighbors):
+            for neighbor in point_neighbors:
+                neighbor = neighbor.strip()
+                if neighbor:
+                    edges.add((point, neighbor))
+                    if not directed:
+                        edges.add((neighbor, point))
+        for _, neighbor in sorted(edges):
+            if neighbor not in names:
+                names.append(neighbor)
+
+        points = np.array(names, dtype=object)
+        index = {name: k for k, name in enumerate(names)}
+        sources = np.array([index[a] for a, _ in edges], dtype=np.int32)
+        targets = np.array([index[b] for _, b in edges], dtype=np.int32)
+        order = np.lexsort((targets, sources))
+        indptr = np.zeros(len(points) + 1, dtype=np.int32)
+        np.cumsum(np.bincount(sources, minlength=len(points)), out=indptr[1:])
+        return cls(points, indptr, targets[order])
+
+    def all_pairs_distance(self):
+        '''
+        BFS from every point over the CSR arrays, distance[i, j] is the number of hops from i to j
+        or UNREACHABLE. The AKL has about 200 points, so the matrix is small.
+        '''
+        n = len(self.points)
+        distance = np.full((n, n), UNREACHABLE, dtype=np.int16)
+        for source in range(n):
+            distance[source, source] = 0
+            frontier = np.array([source], dtype=np.int32)
+            level = 0
+            while len(frontier):
+                level += 1
+                # neighbors of the whole frontier at once
+                starts = self.indptr[frontier]
+                lengths = self.indptr[frontier + 1] - starts
+                positions = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum())
+                reached = np.unique(self.indices[positions])
+                reached = reached[distance[source, reached] == UNREACHABLE]
+                distance[source, reached] = level
+                frontier = reached
+        return distance
+
+    def encode(self, points):
+        '''
+        Returns the indices of the point ids (ints or strings), -1 for points that are not in the topology.
+        '''
+        points = np.asarray(points)
+        if not np.issubdtype(points.dtype, np.integer):
+            return self.point_index.get_indexer(pd.Index(points).astype(str))
+        position = np.minimum(np.searchsorted(self.numeric_ids, points), len(self.numeric_ids) - 1)
+        return np.where(self.numeric_ids[position] == points, self.numeric_index[position], -1)
+
+    def distance_between(self, start, end):
+        start, end = self.encode([start, end])
+        if start < 0 or end < 0:
+            return None
+        return int(self.distance[start, end])
+
+    def validate_hops(self, hop_from, hop_to):
+        '''
+        Vectorized check of hops (arrays of point ids): known (both points are in the topology),
+        distance (shortest hop count, UNREACHABLE if not known or not connected) and possible.
+        '''
+        start, end = self.encode(hop_from), self.encode(hop_to)
+        known = (start >= 0) & (end >= 0)
+        distance = np.full(len(start), UNREACHABLE, dtype=np.int32)
+        distance[known] = self.distance[start[known], end[known]]
+        return pd.DataFrame({
+            'from': hop_from,
+            'to': hop_to,
+            'known': known,
+            'distance': distance,
+            'possible': known & (distance != UNREACHABLE),
+        })
+
+    def validate_routes(self, routes):
+        '''
+        Checks the routes of path_routes (CSR arrays offsets, hop_from, hop_to), one row per route id:
+        hops, unknown_points (hops with a point that is not in the topology), impossible_hops (not connected),
+        distance (sum of the shortest distances of the hops), direct_distance (shortest distance start -> end)
+        and detour_ratio = distance / direct_distance, NaN if a hop is unknown or impossible.
+        '''
+        offsets = routes['offsets']
+        lengths = np.diff(offsets)
+        hops = self.validate_hops(routes['hop_from'], routes['hop_to'])
+        route_of_hop = np.repeat(np.arange(len(lengths)), lengths)
+
+        def per_route(values):
+            return np.bincount(route_of_hop, weights=values, minlength=len(lengths))
+
+        unknown = per_route(~hops['known'].to_numpy()).astype(np.int64)
+        impossible = per_route((hops['known'] & ~hops['possible']).to_numpy()).astype(np.int64)
+        distance = per_route(np.where(hops['possible'], hops['distance'], 0)).astype(np.int64)
+
+        non_empty = lengths > 0
+        first = np.where(non_empty, offsets[:-1], 0)
+        last = np.where(non_empty, offsets[1:] - 1, 0)
+        direct = np.full(len(lengths), UNREACHABLE, dtype=np.int64)
+        if len(routes['hop_from']):
+            start, end = self.encode(routes['hop_from'][first]), self.encode(routes['hop_to'][last])
+            known = non_empty & (start >= 0) & (end >= 0)
+            direct[known] = self.distance[start[known], end[known]]
+
+        valid = non_empty & (unknown == 0) & (impossible == 0) & (direct > 0)
+        detour_ratio = np.full(len(lengths), np.nan)
+        detour_ratio[valid] = distance[valid] / direct[valid]
+        return pd.DataFrame({
+            'hops': lengths,
+            'unknown_points': unknown,
+            'impossible_hops': impossible,
+            'distance': np.where(unknown + impossible == 0, distance, UNREACHABLE),
+            'direct_distance': direct,
+            'detour_ratio': detour_ratio,
+        })
+
+    def validate_path_events(self, df, routes):
+        '''
+        Adds the validate_routes columns to every row of the Path Movement Finished table.
+        Sample usage:
+        checked = graph.validate_path_events(dt_path_movement_finished, load_routes())
+        checked[checked['impossible_hops'] > 0]
+        '''
+        per_route = self.validate_routes(routes)
+        per_event = per_route.iloc[df['route'].to_numpy(dtype=np.int64)].reset_index(drop=True)
+        per_event.index = df.index
+        return pd.concat([df, per_event], axis=1)